@@ -0,0 +1,220 @@
+"""Regression check and microbenchmark for the transaction line parser.
+
+Runs the state-machine parser in parser.extract and the regex/look-ahead
+parser it replaced over the same generated corpus, asserts their output is
+identical, then times both. Run from the backend directory:
+
+    python benchmarks/bench_line_parser.py --pages 2000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser.extract import DATE_LIKE_RE, UnreadableTransaction, _parse_page_lines, clean_amount, parse_completion_time
+
+LEGACY_STATUS_KEYWORDS = r"^(Completed|Failed|Pending)$"
+LEGACY_RECEIPT_NO_PATTERN = r"^[A-Z0-9]{10,}$"
+
+
+def legacy_parse_page_lines(lines):
+    # Frozen copy of the regex/look-ahead parser the state machine replaced
+    records = []
+    head_end = None
+    tail = None
+    n = len(lines)
+    i = 0
+    while i < n:
+        # Match receipt number
+        if re.match(LEGACY_RECEIPT_NO_PATTERN, lines[i].strip()):
+            start = i
+            if head_end is None:
+                head_end = i
+            receipt_no = lines[i].strip()
+            i += 1
+            if i >= n:
+                tail = lines[start:]
+                break
+
+            completion_time = lines[i].strip()
+            i += 1
+            if i >= n:
+                tail = lines[start:]
+                break
+
+            # Look ahead for transaction status
+            details_lines = []
+            status_line_index = None
+            for j in range(i, min(i + 7, n)):
+                if re.match(LEGACY_STATUS_KEYWORDS, lines[j].strip()):
+                    status_line_index = j
+                    break
+
+            if status_line_index is None:
+                # The look-ahead ran off the page: the status may be on the next one
+                if i + 7 > n and tail is None:
+                    tail = lines[start:]
+                i += 1
+                continue
+
+            details_lines = lines[i:status_line_index]
+            details = "\n".join([d.strip() for d in details_lines])
+            transaction_status = lines[status_line_index].strip()
+            i = status_line_index + 1
+
+            # Extract amount and balance
+            monetary_fields = []
+            while i < n and len(monetary_fields) < 2:
+                line = lines[i].strip()
+                if re.match(r'^-?[\d,]+(\.\d{1,2})?$', line) or line in ["", "-"]:
+                    monetary_fields.append(line)
+                    i += 1
+                else:
+                    break
+
+            if len(monetary_fields) < 2 and i >= n:
+                # Amounts may continue on the next page
+                tail = lines[start:]
+                break
+
+            amount = clean_amount(monetary_fields[0]) if len(monetary_fields) > 0 else 0.0
+            balance = clean_amount(monetary_fields[1]) if len(monetary_fields) > 1 else 0.0
+
+            paid_in = amount if amount > 0 else 0.0
+            withdrawn = -amount if amount < 0 else 0.0
+
+            records.append({
+                "receipt_no": receipt_no,
+                "completion_time": completion_time,
+                "details": details,
+                "transaction_status": transaction_status,
+                "paid_in": paid_in,
+                "withdrawn": withdrawn,
+                "balance": balance
+            })
+
+        else:
+            i += 1
+
+    head = lines[:head_end] if head_end is not None else lines
+    return records, head, tail
+
+
+def typed(result):
+    # The legacy parser kept completion times as text. Records whose "time" has
+    # no date in it are now dropped as false matches, and a page with a date
+    # that does not parse is rejected (None), so compare on the typed form.
+    records, head, tail = result
+    converted = []
+    for record in records:
+        completed_at = parse_completion_time(record["completion_time"])
+        if completed_at is None:
+            if DATE_LIKE_RE.search(record["completion_time"]):
+                return None
+            continue
+        converted.append({**record, "completion_time": completed_at})
+    return converted, head, tail
+
+
+def parse_page_lines(lines):
+    try:
+        return _parse_page_lines(lines)
+    except UnreadableTransaction:
+        return None
+
+
+NOISE = [
+    "", " ", "-", "Receipt No.", "Completion Time", "Details", "Transaction Status",
+    "Paid In", "Withdrawn", "Balance", "Page 2 of 9", "Completed ", " Failed", "Reversed",
+    "ABCDEFGHIJ", "1234567890", "12,345.678", "1,000", "-", "Disclaimer: terms apply"
+]
+
+
+def _record_lines(rnd, n, when):
+    receipt = "".join(rnd.choice("ABCDEFGHJKLMNPQRSTUVWXYZ0123456789") for _ in range(10))
+    # Now and then a time in a format the parser does not know, which rejects the page
+    lines = [receipt, when.strftime("%d.%m.%Y %H:%M" if rnd.random() < 0.002 else "%Y-%m-%d %H:%M:%S")]
+    lines += [rnd.choice(["Customer Transfer to", "Funds received from", "Pay Bill to", "Merchant Payment"])]
+    for _ in range(rnd.choice([0, 1, 1, 2, 3, 6])):
+        lines.append(rnd.choice([f"0712***{n % 1000:03d} - JOHN DOE", "Acc. 4455", "SAFARICOM POSTPAID", "TILLNUMBER99"]))
+    lines.append(rnd.choice(["Completed", "Completed", "Completed", "Failed", "Pending"]))
+    amount = f"{rnd.uniform(1, 90000):,.2f}"
+    lines.append(rnd.choice([amount, "-" + amount, "", "-"]))
+    lines.append(rnd.choice([f"{rnd.uniform(0, 90000):,.2f}", "", "-", "1,000"]))
+    # Mangle some records so truncation and look-ahead failures are covered
+    roll = rnd.random()
+    if roll < 0.05:
+        lines = lines[:rnd.randint(1, len(lines))]
+    elif roll < 0.10:
+        lines.insert(rnd.randint(1, len(lines)), rnd.choice(NOISE))
+    return [("  " + line if rnd.random() < 0.1 else line) for line in lines]
+
+
+def make_corpus(pages, rows_per_page=25, seed=7):
+    rnd = random.Random(seed)
+    when = datetime(2023, 1, 1)
+    corpus = []
+    n = 0
+    for _ in range(pages):
+        lines = ["Receipt No.", "Completion Time", "Details", "Transaction Status", "Paid In", "Withdrawn", "Balance"]
+        for _ in range(rows_per_page):
+            n += 1
+            when += timedelta(minutes=rnd.randint(1, 600))
+            lines += _record_lines(rnd, n, when)
+            if rnd.random() < 0.05:
+                lines.append(rnd.choice(NOISE))
+        if rnd.random() < 0.2:
+            lines = lines[:rnd.randint(len(lines) // 2, len(lines))]
+        lines.append("")  # get_text() ends every page with a newline
+        corpus.append(lines)
+    return corpus
+
+
+def bench(fn, corpus, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for lines in corpus:
+            fn(lines)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.pages, seed=args.seed)
+    lines_total = sum(len(lines) for lines in corpus)
+
+    records = rejected = 0
+    for page, lines in enumerate(corpus):
+        expected = typed(legacy_parse_page_lines(lines))
+        actual = parse_page_lines(lines)
+        if expected != actual:
+            print(f"MISMATCH on page {page}")
+            print("legacy: ", expected)
+            print("current:", actual)
+            sys.exit(1)
+        records += len(actual[0]) if actual else 0
+        rejected += actual is None
+    print(f"regression: {len(corpus)} pages, {lines_total} lines, {records} records identical, {rejected} pages rejected by both")
+
+    legacy = bench(legacy_parse_page_lines, corpus, args.repeat)
+    current = bench(parse_page_lines, corpus, args.repeat)
+    print(f"legacy        {legacy * 1000:9.1f} ms  {lines_total / legacy:12.0f} lines/s")
+    print(f"state machine {current * 1000:9.1f} ms  {lines_total / current:12.0f} lines/s")
+    print(f"speedup       {legacy / current:9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Cross-check and benchmark the word-position transaction parser.
+
+Generates statements with benchmarks/statement_generator.py, asserts that
+the 'words' engine in parser.extract yields exactly the generated rows and
+the same records as the 'lines' engine, then times both engines on one
+process. Statements generated with --split-rows continue some details on
+the next page after the row's amounts; only the words engine can put those
+back, so the lines engine is not compared on them. Run from the backend
+directory:
+
+    python benchmarks/bench_word_parser.py --pages 60
+"""
+import argparse
+import os
+import sys
+import textwrap
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from parser.document import open_statement
+from parser.extract import iter_transactions
+from statement_generator import DETAILS_WIDTH, generate_statement, generate_transactions
+
+
+def expected_records(rows):
+    # The generated rows as the extractors report them: wrapped details, one amount column per direction
+    return [
+        (
+            row["receipt_no"],
+            row["completion_time"],
+            "\n".join(part for line in row["details"] for part in textwrap.wrap(line, DETAILS_WIDTH)),
+            row["transaction_status"],
+            row["paid_in"] or 0,
+            row["withdrawn"] or 0,
+            row["balance"]
+        )
+        for row in rows
+    ]
+
+
+def as_tuples(records):
+    return [
+        (r["receipt_no"], r["completion_time"], r["details"], r["transaction_status"], r["paid_in"], r["withdrawn"], r["balance"])
+        for r in records
+    ]
+
+
+def first_difference(expected, actual):
+    for n, (want, got) in enumerate(zip(expected, actual)):
+        if want != got:
+            return f"record {n}:\n  expected {want}\n  actual   {got}"
+    return f"{len(expected)} records expected, {len(actual)} parsed"
+
+
+def parse(data, engine):
+    statement = open_statement(data)
+    try:
+        return list(iter_transactions(statement, parallel=False, engine=engine))
+    finally:
+        statement.close()
+
+
+def cross_check(seeds, sizes):
+    checked = 0
+    for split_rows in (False, True):
+        for seed in seeds:
+            for rows in sizes:
+                data = generate_statement(rows=rows, seed=seed, split_rows=split_rows)
+                expected = expected_records(generate_transactions(rows, seed=seed)[0])
+                words = as_tuples(parse(data, "words"))
+                label = f"seed={seed} rows={rows} split_rows={split_rows}"
+                if words != expected:
+                    print(f"MISMATCH (words vs generated) {label}: {first_difference(expected, words)}")
+                    sys.exit(1)
+                if not split_rows:
+                    lines = as_tuples(parse(data, "lines"))
+                    if lines != words:
+                        print(f"MISMATCH (lines vs words) {label}: {first_difference(lines, words)}")
+                        sys.exit(1)
+                checked += len(words)
+    return checked
+
+
+def bench(data, engine, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        records = parse(data, engine)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=60, help="Approximate page count of the timed statement")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seeds", type=int, default=4, help="Statements per size in the cross-check")
+    args = parser.parse_args()
+
+    checked = cross_check(range(args.seeds), (1, 25, 180, 700))
+    print(f"cross-check: {checked} records identical to the generated rows")
+
+    data = generate_statement(pages=args.pages)
+    with open_statement(data) as statement:
+        pages = statement.page_count
+    for engine in ("lines", "words"):
+        elapsed, rows = bench(data, engine, args.repeat)
+        print(f"{engine:6} {elapsed * 1000:9.1f} ms  {pages / elapsed:8.0f} pages/s  {rows / elapsed:9.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Generate synthetic M-PESA statement PDFs with PyMuPDF.
+
+The layout follows the real statements closely enough for every extractor
+in parser.extract: a metadata header, the summary table on page 1, the
+detailed statement with its column titles repeated on each page, multi-line
+details, charge rows sharing the receipt of their payment, and a footer
+with the verification code and disclaimer. Run from the backend directory:
+
+    python benchmarks/statement_generator.py statement.pdf --pages 50 --password 1234
+"""
+import argparse
+import random
+import textwrap
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import fitz
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+FONT_SIZE = 7
+ROW_HEIGHT = 26
+TABLE_TOP = 60
+TABLE_BOTTOM = 780
+COLUMNS = {
+    "receipt_no": 30,
+    "completion_time": 95,
+    "details": 180,
+    "transaction_status": 350,
+    "paid_in": 410,
+    "withdrawn": 465,
+    "balance": 525,
+}
+COLUMN_TITLES = ["Receipt No.", "Completion Time", "Details", "Transaction Status", "Paid In", "Withdrawn", "Balance"]
+DETAILS_WIDTH = 40  # characters per details line
+RECEIPT_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+PEOPLE = ["JOHN DOE", "JANE ROE", "MARY WANJIKU", "PETER OTIENO", "GRACE AKINYI", "DAVID KIPROTICH", "FAITH MUTHONI"]
+PAYBILLS = [("888880", "KPLC PREPAID"), ("247247", "EQUITY PAYBILL ACCOUNT"), ("522522", "KCB PAYBILL AC"), ("444900", "ZUKU")]
+TILLS = [("512345", "NAIVAS SUPERMARKET KILIMANI"), ("698123", "CARREFOUR JUNCTION"), ("771234", "QUICKMART LAVINGTON"), ("300100", "MAMA MBOGA STALL")]
+AGENTS = [("102030", "WESTLANDS MOBILE SHOP"), ("405060", "KAWANGWARE AGENCIES")]
+
+# (summary table row, weight, direction, details builder)
+TRANSACTION_KINDS = [
+    ("SEND MONEY", 30, "out", lambda r: ("Customer Transfer to", f"0712***{r.randint(100, 999)} - {r.choice(PEOPLE)}")),
+    ("RECEIVED MONEY", 20, "in", lambda r: ("Funds received from", f"0722***{r.randint(100, 999)} - {r.choice(PEOPLE)}")),
+    ("LIPA NA M-PESA (PAYBILL)", 15, "out", lambda r: _paybill(r)),
+    ("LIPA NA M-PESA (BUY GOODS)", 20, "out", lambda r: _till(r, "Merchant Payment to")),
+    ("AGENT WITHDRAWAL", 6, "out", lambda r: _till(r, "Customer Withdrawal At Agent Till", AGENTS)),
+    ("AGENT DEPOSIT", 4, "in", lambda r: _till(r, "Deposit of Funds at Agent Till", AGENTS)),
+    ("OTHERS", 5, "out", lambda r: ("Airtime Purchase",)),
+]
+CHARGED_KINDS = {"SEND MONEY": "Customer Transfer of Funds Charge", "LIPA NA M-PESA (PAYBILL)": "Pay Bill Charge",
+                 "AGENT WITHDRAWAL": "Withdrawal Charge"}
+
+
+def _paybill(rnd):
+    number, name = rnd.choice(PAYBILLS)
+    return (f"Pay Bill to {number} - {name}", f"Acc. {rnd.randint(10000, 99999)}")
+
+
+def _till(rnd, prefix, choices=TILLS):
+    number, name = rnd.choice(choices)
+    return (f"{prefix} {number} - {name}",)
+
+
+def _money(value):
+    return f"{value:,.2f}"
+
+
+def _charge_for(amount):
+    return Decimal("0.00") if amount <= 100 else Decimal("13.00") if amount <= 1500 else Decimal("29.00")
+
+
+def generate_transactions(count, seed=0, start=datetime(2024, 1, 1, 7, 0), opening_balance=Decimal("15000.00")):
+    """Return `count` statement rows (newest last) with running balances, and the summary table totals."""
+    rnd = random.Random(seed)
+    kinds = TRANSACTION_KINDS
+    weights = [kind[1] for kind in kinds]
+    totals = {kind[0]: [Decimal("0.00"), Decimal("0.00")] for kind in kinds}
+
+    rows = []
+    moment = start
+    balance = opening_balance
+    while len(rows) < count:
+        name, _, direction, details = rnd.choices(kinds, weights)[0]
+        moment += timedelta(minutes=rnd.randint(5, 600))
+        receipt = "".join(rnd.choice(RECEIPT_ALPHABET) for _ in range(10))
+        amount = Decimal(f"{rnd.uniform(20, 4000 if direction == 'out' else 8000):.2f}")
+        if direction == "out" and amount > balance:
+            direction, name, details = "in", "RECEIVED MONEY", kinds[1][3]
+        status = "Failed" if rnd.random() < 0.01 else "Completed"
+
+        if status == "Completed":
+            balance += amount if direction == "in" else -amount
+            totals[name][0 if direction == "in" else 1] += amount
+        rows.append({
+            "receipt_no": receipt,
+            "completion_time": moment,
+            "details": details(rnd),
+            "transaction_status": status,
+            "paid_in": amount if direction == "in" else None,
+            "withdrawn": amount if direction == "out" else None,
+            "balance": balance
+        })
+
+        # Charges are printed as a separate row with the payment's receipt number
+        charge = _charge_for(amount)
+        if status == "Completed" and name in CHARGED_KINDS and charge <= balance and len(rows) < count:
+            balance -= charge
+            totals["OTHERS"][1] += charge
+            rows.append({
+                "receipt_no": receipt,
+                "completion_time": moment,
+                "details": (CHARGED_KINDS[name],),
+                "transaction_status": "Completed",
+                "paid_in": None,
+                "withdrawn": charge,
+                "balance": balance
+            })
+
+    return rows, totals
+
+
+class StatementLayout:
+    """Writes rows onto pages, starting a new page when the current one is full.
+
+    With `split_rows`, a row whose details do not fit continues them below
+    the next page's column titles instead of moving to the next page whole.
+    """
+
+    def __init__(self, doc, split_rows=False):
+        self.doc = doc
+        self.split_rows = split_rows
+        self.page = None
+        self.y = 0
+
+    def text(self, x, y, value, size=FONT_SIZE):
+        self.page.insert_text((x, y), value, fontsize=size)
+
+    def new_page(self):
+        self.page = self.doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        self.y = TABLE_TOP
+
+    def column_titles(self):
+        for title, x in zip(COLUMN_TITLES, COLUMNS.values()):
+            self.text(x, self.y, title)
+        self.y += 16
+
+    def row(self, row):
+        # Long details wrap inside their column, as on the real statements
+        details = [part for line in row["details"] for part in textwrap.wrap(line, DETAILS_WIDTH)]
+        # Split rows only need room for their first line
+        height = 0 if self.split_rows else ROW_HEIGHT + 9 * (len(details) - 1)
+        if self.page is None or self.y + height > TABLE_BOTTOM:
+            self.new_page()
+            self.column_titles()
+        y = self.y
+        first_page = self.page.number
+        self.text(COLUMNS["receipt_no"], y, row["receipt_no"])
+        self.text(COLUMNS["completion_time"], y, row["completion_time"].strftime("%Y-%m-%d %H:%M:%S"))
+        line_y = y
+        for n, line in enumerate(details):
+            if n:
+                line_y += 9
+                if line_y > TABLE_BOTTOM:
+                    self.new_page()
+                    self.column_titles()
+                    line_y = self.y
+            self.text(COLUMNS["details"], line_y, line)
+        # Status and amounts stay on the row's first line, even when its details continue overleaf
+        cells = [("transaction_status", row["transaction_status"])]
+        if row["paid_in"] is not None:
+            cells.append(("paid_in", _money(row["paid_in"])))
+        if row["withdrawn"] is not None:
+            cells.append(("withdrawn", "-" + _money(row["withdrawn"])))
+        cells.append(("balance", _money(row["balance"])))
+        page = self.doc[first_page] if self.page.number != first_page else self.page
+        for column, value in cells:
+            page.insert_text((COLUMNS[column], y), value, fontsize=FONT_SIZE)
+        self.y = line_y + ROW_HEIGHT
+
+
+def _header(layout, customer_name, mobile_number, start, end, totals):
+    layout.new_page()
+    layout.text(30, 40, "M-PESA STATEMENT", size=12)
+    y = 62
+    for line in [
+        f"Customer Name: {customer_name}",
+        f"Mobile Number: {mobile_number}",
+        f"Email Address: {customer_name.split()[0].lower()}@example.com",
+        f"Statement Period: {start:%d %b %Y} - {end:%d %b %Y}",
+        f"Request Date: {end + timedelta(days=1):%d %b %Y}",
+    ]:
+        layout.text(30, y, line, size=8)
+        y += 12
+
+    # Summary table: one text line per row, spaced so each row is its own block
+    y += 14
+    layout.text(30, y, "SUMMARY", size=8)
+    y += 14
+    layout.text(30, y, "TRANSACTION TYPE        PAID IN        PAID OUT", size=8)
+    y += 18
+    paid_in_total = paid_out_total = Decimal("0.00")
+    for name, (paid_in, paid_out) in totals.items():
+        layout.text(30, y, f"{name}: {_money(paid_in)} {_money(paid_out)}", size=8)
+        paid_in_total += paid_in
+        paid_out_total += paid_out
+        y += 18
+    layout.text(30, y, f"TOTAL: {_money(paid_in_total)} {_money(paid_out_total)}", size=8)
+    y += 24
+    layout.text(30, y, "DETAILED STATEMENT", size=8)
+    layout.y = y + 18
+    layout.column_titles()
+
+
+def _footer(layout, seed):
+    rnd = random.Random(seed)
+    layout.text(30, 805, f"Verification Code: {''.join(rnd.choice(RECEIPT_ALPHABET) for _ in range(8))}")
+    layout.text(30, 815, "Disclaimer: This record is produced for your information only and is not a legal document.")
+
+
+def generate_statement(path=None, pages=None, rows=None, password=None, seed=0,
+                       customer_name="JOHN DOE", mobile_number="0712345678", split_rows=False):
+    """Build a statement PDF and write it to `path`, or return its bytes when `path` is None.
+
+    Give either `rows` (transaction rows) or `pages` (roughly fills that many
+    pages). With a `password` the file is AES-256 encrypted; `split_rows`
+    lets details continue across page breaks (see StatementLayout).
+    """
+    if rows is None:
+        rows = max(1, (pages or 1) * ((TABLE_BOTTOM - TABLE_TOP) // (ROW_HEIGHT + 5)) - 10)
+    transactions, totals = generate_transactions(rows, seed=seed)
+
+    doc = fitz.open()
+    layout = StatementLayout(doc, split_rows=split_rows)
+    _header(layout, customer_name, mobile_number, transactions[0]["completion_time"], transactions[-1]["completion_time"], totals)
+    for row in transactions:
+        layout.row(row)
+    _footer(layout, seed)
+
+    options = {"garbage": 3, "deflate": True}
+    if password:
+        options.update(encryption=fitz.PDF_ENCRYPT_AES_256, user_pw=password, owner_pw=password + "-owner")
+    if path is None:
+        data = doc.tobytes(**options)
+        doc.close()
+        return data
+    doc.save(path, **options)
+    doc.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--pages", type=int, default=None, help="Approximate page count")
+    parser.add_argument("--rows", type=int, default=None, help="Exact transaction row count")
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--split-rows", action="store_true", help="Let details continue across page breaks")
+    args = parser.parse_args()
+
+    generate_statement(args.path, pages=args.pages, rows=args.rows, password=args.password, seed=args.seed,
+                       split_rows=args.split_rows)
+    with fitz.open(args.path) as doc:
+        print(f"wrote {args.path}: {doc.page_count} pages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Gunicorn settings: gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is preloaded in the master and forked into the workers. Defaults
+follow APP_PROFILE: the read API runs many threaded workers with short
+timeouts, ingestion fewer workers with timeouts long enough for large
+statements. Every GUNICORN_* variable overrides its default.
+"""
+import os
+import sys
+
+profile = os.getenv('APP_PROFILE', 'all').lower()
+cpus = os.cpu_count() or 1
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() == 'true'
+worker_class = 'gthread'
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+
+if profile == 'api':
+    workers = int(os.getenv('GUNICORN_WORKERS', str(cpus * 2 + 1)))
+    threads = int(os.getenv('GUNICORN_THREADS', '8'))
+    timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+    max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '5000'))
+else:
+    # Parsing is CPU-bound and each worker has its own parse process pool; keep the workers few
+    workers = int(os.getenv('GUNICORN_WORKERS', str(max(2, cpus // 2))))
+    threads = int(os.getenv('GUNICORN_THREADS', '4'))
+    timeout = int(os.getenv('GUNICORN_TIMEOUT', '600'))
+    max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '500'))
+max_requests_jitter = max_requests // 10
+graceful_timeout = timeout
+
+
+def post_fork(server, worker):
+    # Pooled connections opened in the master must not be shared by the forked workers
+    wsgi = sys.modules.get('wsgi')
+    if wsgi is not None:
+        from models import db
+        with wsgi.app.app_context():
+            db.engine.dispose(close=False)
+        if wsgi.app.config['APP_PROFILE'] != 'api':
+            # Before the worker starts its request and job threads
+            from parser.extract import start_parse_pool
+            start_parse_pool(wsgi.app)
@@ -0,0 +1,150 @@
+"""Type money and timestamp columns
+
+Revision ID: 69e6737b878a
+Revises: b8f032412554
+Create Date: 2026-10-18 15:40:23.065681
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '69e6737b878a'
+down_revision = 'b8f032412554'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 5000
+MONEY = sa.Numeric(precision=14, scale=2)
+
+transaction = sa.table(
+    'transaction',
+    sa.column('id', sa.Integer),
+    sa.column('completion_time', sa.String),
+    sa.column('completed_at', sa.DateTime)
+)
+
+total_summary = sa.table(
+    'total_summary',
+    sa.column('id', sa.Integer),
+    sa.column('total_paid_in', sa.String),
+    sa.column('total_paid_out', sa.String)
+)
+
+# Frozen copy of the parser's formats as of this revision, so later parser changes cannot alter it
+COMPLETION_TIME_FORMATS = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%Y-%m-%d %H:%M")
+
+
+def parse_completion_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in COMPLETION_TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+# Float columns become exact two-place amounts
+FLOAT_COLUMNS = [
+    ('received_summary', 'total_received', False),
+    ('spending_summary', 'total_spent', False),
+    ('transaction', 'paid_in', True),
+    ('transaction', 'withdraw', True),
+    ('transaction', 'balance', True),
+]
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    for table, column, nullable in FLOAT_COLUMNS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(column, existing_type=sa.FLOAT(), type_=MONEY, existing_nullable=nullable,
+                                  postgresql_using=f'round({column}::numeric, 2)')
+
+    # Statement totals were stored as text with thousands separators
+    op.execute(total_summary.update().values(
+        total_paid_in=sa.func.replace(total_summary.c.total_paid_in, ',', ''),
+        total_paid_out=sa.func.replace(total_summary.c.total_paid_out, ',', '')
+    ))
+    with op.batch_alter_table('total_summary', schema=None) as batch_op:
+        for column in ('total_paid_in', 'total_paid_out'):
+            batch_op.alter_column(column, existing_type=sa.VARCHAR(), type_=MONEY, existing_nullable=False,
+                                  postgresql_using=f'{column}::numeric(14, 2)')
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_pdf_id_completion_time')
+
+    # Parse the text in batches with the frozen day-first formats on every backend; a
+    # Postgres cast would read it by the server's DateStyle (MDY unless configured)
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('completed_at', sa.DateTime(), nullable=True))
+
+    set_completed_at = transaction.update().where(transaction.c.id == sa.bindparam('txn_id')) \
+        .values(completed_at=sa.bindparam('parsed'))
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(transaction.c.id, transaction.c.completion_time)
+            .where(transaction.c.id > last_id).order_by(transaction.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for txn_id, text in rows:
+            completed_at = parse_completion_time(text.strip())
+            if completed_at is None:
+                raise ValueError(f"transaction {txn_id}: unparseable completion time {text!r}")
+            updates.append({"txn_id": txn_id, "parsed": completed_at})
+        conn.execute(set_completed_at, updates)
+        last_id = rows[-1].id
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_column('completion_time')
+        batch_op.alter_column('completed_at', new_column_name='completion_time',
+                              existing_type=sa.DateTime(), nullable=False)
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.create_index('ix_transaction_pdf_id_completion_time', ['pdf_id', 'completion_time', 'id'], unique=False)
+
+
+def downgrade():
+    conn = op.get_bind()
+    postgres = conn.dialect.name == 'postgresql'
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_pdf_id_completion_time')
+        batch_op.alter_column('completion_time', existing_type=sa.DateTime(), type_=sa.VARCHAR(),
+                              existing_nullable=False,
+                              postgresql_using="to_char(completion_time, 'YYYY-MM-DD HH24:MI:SS')")
+    if not postgres:
+        # Drop the fractional seconds other backends store with DateTime
+        op.execute(transaction.update().values(
+            completion_time=sa.func.substr(transaction.c.completion_time, 1, 19)
+        ))
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.create_index('ix_transaction_pdf_id_completion_time', ['pdf_id', 'completion_time', 'id'], unique=False)
+
+    with op.batch_alter_table('total_summary', schema=None) as batch_op:
+        for column in ('total_paid_in', 'total_paid_out'):
+            batch_op.alter_column(column, existing_type=MONEY, type_=sa.VARCHAR(), existing_nullable=False,
+                                  postgresql_using=f"to_char({column}, 'FM999,999,999,990.00')")
+    if not postgres:
+        rows = conn.execute(sa.select(total_summary)).all()
+        for row in rows:
+            conn.execute(total_summary.update().where(total_summary.c.id == row.id).values(
+                total_paid_in=f"{float(row.total_paid_in):,.2f}",
+                total_paid_out=f"{float(row.total_paid_out):,.2f}"
+            ))
+
+    for table, column, nullable in reversed(FLOAT_COLUMNS):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(column, existing_type=MONEY, type_=sa.FLOAT(), existing_nullable=nullable)
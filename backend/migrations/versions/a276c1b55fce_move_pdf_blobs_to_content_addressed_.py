@@ -0,0 +1,66 @@
+"""Move PDF blobs to content-addressed store
+
+Revision ID: a276c1b55fce
+Revises: 5fc26676ee4b
+Create Date: 2026-10-18 15:30:03.108482
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import hashlib
+
+from parser.storage import get_blob_store
+
+
+# revision identifiers, used by Alembic.
+revision = 'a276c1b55fce'
+down_revision = '5fc26676ee4b'
+branch_labels = None
+depends_on = None
+
+
+pdf_document = sa.table(
+    'pdf_document',
+    sa.column('id', sa.Integer),
+    sa.column('content', sa.LargeBinary),
+    sa.column('blob_key', sa.String),
+    sa.column('size', sa.BigInteger)
+)
+
+
+def upgrade():
+    with op.batch_alter_table('pdf_document', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('blob_key', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('size', sa.BigInteger(), nullable=True))
+
+    # Copy every blob into the store, one row at a time to keep memory flat
+    conn = op.get_bind()
+    store = get_blob_store()
+    ids = [row.id for row in conn.execute(sa.select(pdf_document.c.id).order_by(pdf_document.c.id))]
+    for pdf_id in ids:
+        content = conn.execute(sa.select(pdf_document.c.content).where(pdf_document.c.id == pdf_id)).scalar()
+        key = hashlib.sha256(content).hexdigest()
+        store.put_bytes(key, content)
+        conn.execute(pdf_document.update().where(pdf_document.c.id == pdf_id).values(blob_key=key, size=len(content)))
+
+    with op.batch_alter_table('pdf_document', schema=None) as batch_op:
+        batch_op.alter_column('blob_key', existing_type=sa.String(length=64), nullable=False)
+        batch_op.alter_column('size', existing_type=sa.BigInteger(), nullable=False)
+        batch_op.drop_column('content')
+
+
+def downgrade():
+    with op.batch_alter_table('pdf_document', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content', sa.LargeBinary(), nullable=True))
+
+    # Blobs are left in the store; delete the directory by hand once satisfied
+    conn = op.get_bind()
+    store = get_blob_store()
+    rows = conn.execute(sa.select(pdf_document.c.id, pdf_document.c.blob_key).order_by(pdf_document.c.id)).all()
+    for pdf_id, key in rows:
+        conn.execute(pdf_document.update().where(pdf_document.c.id == pdf_id).values(content=store.read(key)))
+
+    with op.batch_alter_table('pdf_document', schema=None) as batch_op:
+        batch_op.alter_column('content', existing_type=sa.LargeBinary(), nullable=False)
+        batch_op.drop_column('size')
+        batch_op.drop_column('blob_key')
@@ -0,0 +1,444 @@
+"""Intern counterparty and category names
+
+Revision ID: bac960ba503b
+Revises: f7a025833fae
+Create Date: 2026-10-18 15:48:45.496973
+
+"""
+import re
+from collections import namedtuple
+from datetime import timedelta
+
+from alembic import op
+from flask import current_app, has_app_context
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bac960ba503b'
+down_revision = 'f7a025833fae'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 5000
+
+
+# Frozen copies of parser.normalize and the rollup bucketing as of this revision: the
+# data is rebuilt the way the app did it then, whatever those modules become later.
+Normalized = namedtuple("Normalized", ["counterparty", "category"])
+
+# Transaction types, tried in order. Patterns see the details text with its
+# whitespace collapsed; {party} captures the counterparty and {code} a till,
+# paybill or agent number.
+DEFAULT_RULES = [
+    ("Charges", r".*\bCharge"),
+    ("Pay Bill", r"Pay Bill(?: Online)? (?:to|from) {code} - {party}?(?: Acc\. ?\S*)?"),
+    ("Buy Goods", r"(?:Merchant Payment|Buy Goods)(?: Online)? to {code} - {party}"),
+    ("Withdrawal", r"Customer Withdrawal At Agent Till {code} - {party}"),
+    ("Deposit", r"Deposit of Funds at Agent Till {code} - {party}"),
+    ("Business Payment", r"(?:Business|Promotion) Payment from {code} - {party}?(?: via API.*)?"),
+    ("Send Money", r"Customer (?:Transfer|Send Money)(?: to| Fuliza M-Pesa to)? {party}"),
+    ("Received Money", r"Funds received from {party}"),
+    ("Airtime", r"(?:Airtime|Bundle) Purchase(?: for| to)?{party}?"),
+    ("Fuliza", r"(?:OD Loan Repayment|OverDraft of Credit Party|Overdraft).*"),
+    ("M-Shwari", r"M-Shwari.*"),
+]
+
+# Canonical merchants and the names or paybill/till numbers they appear under.
+# Names match on a word prefix: "NAIVAS" also covers "NAIVAS SUPERMARKET KILIMANI".
+DEFAULT_MERCHANTS = {
+    "KPLC": ["KPLC", "KPLC PREPAID", "KPLC POSTPAID", "KENYA POWER", "888880", "888888"],
+    "SAFARICOM": ["SAFARICOM", "SAFARICOM DATA BUNDLES", "SAFARICOM OFFERS", "SAFARICOM POSTPAID"],
+    "EQUITY BANK": ["EQUITY BANK", "EQUITY PAYBILL ACCOUNT", "247247"],
+    "KCB": ["KCB", "KCB PAYBILL AC", "KENYA COMMERCIAL BANK", "522522"],
+    "NAIVAS": ["NAIVAS"],
+    "CARREFOUR": ["CARREFOUR", "MAJID AL FUTTAIM"],
+    "QUICKMART": ["QUICKMART", "QUICK MART"],
+    "ZUKU": ["ZUKU", "WANANCHI GROUP"],
+}
+
+OTHER = "Other"
+
+_PHONE_PREFIX_RE = re.compile(r"^(?:\+?254|0)?[\d*]{6,}\s*-\s*")  # "0712***101 - " before a name
+_NOISE_RE = re.compile(r"[^A-Z0-9&' -]+")
+
+
+class MerchantTrie:
+    """Word-level prefix trie mapping merchant names to canonical names."""
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, name, canonical):
+        node = self.root
+        for token in name.upper().split():
+            node = node.setdefault(token, {})
+        node[None] = canonical
+
+    def match(self, tokens):
+        # Longest registered prefix of `tokens`
+        node = self.root
+        found = None
+        for token in tokens:
+            node = node.get(token)
+            if node is None:
+                break
+            found = node.get(None, found)
+        return found
+
+
+class Normalizer:
+    """Map raw transaction details to a canonical counterparty and category.
+
+    All rules are compiled into one alternation, so each details string is
+    scanned once; results are memoized because the same details repeat
+    throughout a statement.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES, merchants=DEFAULT_MERCHANTS, cache_size=50000):
+        self.categories = [category for category, _ in rules]
+        self.groups = []
+        alternatives = []
+        for i, (_, pattern) in enumerate(rules):
+            self.groups.append((
+                f"r{i}_party" if "{party}" in pattern else None,
+                f"r{i}_code" if "{code}" in pattern else None
+            ))
+            pattern = pattern.replace("{party}", rf"(?P<r{i}_party>.+?)").replace("{code}", rf"(?P<r{i}_code>\d+)")
+            alternatives.append(rf"(?P<r{i}>{pattern})")
+        self.pattern = re.compile(r"(?:" + "|".join(alternatives) + r")\Z", re.IGNORECASE)
+
+        self.trie = MerchantTrie()
+        for canonical, names in merchants.items():
+            for name in names:
+                self.trie.insert(name, canonical)
+
+        self.cache_size = cache_size
+        self._cache = {}
+
+    def register_merchant(self, canonical, *names):
+        for name in names:
+            self.trie.insert(name, canonical)
+        self._cache.clear()
+
+    def _counterparty(self, party, code):
+        # A known till/paybill number wins over whatever name is printed next to it
+        if code:
+            canonical = self.trie.match([code])
+            if canonical:
+                return canonical
+        if not party:
+            return None
+        party = _NOISE_RE.sub(" ", _PHONE_PREFIX_RE.sub("", party.strip()).upper())
+        tokens = party.split()
+        if not tokens:
+            return None
+        return self.trie.match(tokens) or " ".join(tokens)
+
+    def normalize(self, details):
+        result = self._cache.get(details)
+        if result is not None:
+            return result
+
+        text = " ".join(details.split())
+        match = self.pattern.match(text)
+        if match:
+            index = int(match.lastgroup[1:])
+            category = self.categories[index]
+            party_group, code_group = self.groups[index]
+            counterparty = self._counterparty(
+                match.group(party_group) if party_group else None,
+                match.group(code_group) if code_group else None
+            ) or category.upper()
+        else:
+            category = OTHER
+            counterparty = self._counterparty(text, None) or OTHER.upper()
+
+        result = Normalized(counterparty[:255], category)
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[details] = result
+        return result
+
+
+default_normalizer = Normalizer()
+
+
+def normalize_details(details):
+    return default_normalizer.normalize(details)
+
+
+GRANULARITIES = ("day", "week", "month")
+
+
+def period_start(moment, granularity):
+    day = moment.date()
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())  # weeks start on Monday
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _granularities():
+    if has_app_context():
+        return current_app.config.get('ROLLUP_GRANULARITIES', GRANULARITIES)
+    return GRANULARITIES
+
+interned_string = sa.table(
+    'interned_string',
+    sa.column('id', sa.Integer),
+    sa.column('kind', sa.String),
+    sa.column('value', sa.String)
+)
+
+transaction = sa.table(
+    'transaction',
+    sa.column('id', sa.Integer),
+    sa.column('pdf_id', sa.Integer),
+    sa.column('details', sa.String),
+    sa.column('completion_time', sa.DateTime),
+    sa.column('paid_in', sa.Numeric(14, 2)),
+    sa.column('withdraw', sa.Numeric(14, 2)),
+    sa.column('counterparty_id', sa.Integer),
+    sa.column('category_id', sa.Integer)
+)
+
+customer_ledger = sa.table(
+    'customer_ledger',
+    sa.column('id', sa.Integer),
+    sa.column('customer_id', sa.Integer),
+    sa.column('details', sa.String),
+    sa.column('completion_time', sa.DateTime),
+    sa.column('paid_in', sa.Numeric(14, 2)),
+    sa.column('withdraw', sa.Numeric(14, 2))
+)
+
+
+def _summary_table(name, total_column):
+    return sa.table(
+        name,
+        sa.column('id', sa.Integer),
+        sa.column('pdf_id', sa.Integer),
+        sa.column('category', sa.String),
+        sa.column('counterparty_id', sa.Integer),
+        sa.column(total_column, sa.Numeric(14, 2)),
+        sa.column('transaction_count', sa.Integer)
+    )
+
+
+def _rollup_table(name, scope_column):
+    return sa.table(
+        name,
+        sa.column('id', sa.Integer),
+        sa.column(scope_column, sa.Integer),
+        sa.column('granularity', sa.String),
+        sa.column('period_start', sa.Date),
+        sa.column('direction', sa.String),
+        sa.column('category', sa.String),
+        sa.column('category_id', sa.Integer),
+        sa.column('total', sa.Numeric(14, 2)),
+        sa.column('transaction_count', sa.Integer)
+    )
+
+
+spending_summary = _summary_table('spending_summary', 'total_spent')
+received_summary = _summary_table('received_summary', 'total_received')
+document_rollup = _rollup_table('document_rollup', 'pdf_id')
+customer_rollup = _rollup_table('customer_rollup', 'customer_id')
+
+
+class _Interner:
+    def __init__(self, conn):
+        self.conn = conn
+        self.ids = {}
+        self.names = {}
+
+    def __call__(self, kind, value):
+        key = (kind, value)
+        if key not in self.ids:
+            self.conn.execute(interned_string.insert().values(kind=kind, value=value))
+            self.ids[key] = self.conn.execute(sa.select(interned_string.c.id).where(
+                interned_string.c.kind == kind, interned_string.c.value == value)).scalar_one()
+            self.names[self.ids[key]] = value
+        return self.ids[key]
+
+
+def _batches(conn, table, order_columns, columns):
+    # Keyset scan in (order_columns) order, BATCH_SIZE rows at a time
+    last = None
+    while True:
+        query = sa.select(*[table.c[c] for c in columns]).order_by(*[table.c[c] for c in order_columns]).limit(BATCH_SIZE)
+        if last is not None:
+            query = query.where(sa.tuple_(*[table.c[c] for c in order_columns]) > last)
+        rows = conn.execute(query).all()
+        if not rows:
+            return
+        yield rows
+        last = tuple(getattr(rows[-1], c) for c in order_columns)
+
+
+class _Aggregate:
+    # Summaries and rollup buckets for one document or customer
+    def __init__(self):
+        self.spending = {}
+        self.received = {}
+        self.buckets = {}
+
+    def add(self, counterparty_id, category_id, moment, paid_in, withdrawn):
+        for direction, amount, summary in (("out", withdrawn, self.spending), ("in", paid_in, self.received)):
+            if not amount:
+                continue
+            entry = summary.setdefault(counterparty_id, [0, 0])
+            entry[0] += amount
+            entry[1] += 1
+            for granularity in _granularities():
+                bucket = self.buckets.setdefault((granularity, period_start(moment, granularity), direction, category_id), [0, 0])
+                bucket[0] += amount
+                bucket[1] += 1
+
+    def rollup_rows(self, scope_column, scope_id, names):
+        # The old string column is still NOT NULL until it is dropped, so fill it too
+        return [
+            {scope_column: scope_id, "granularity": g, "period_start": p, "direction": d,
+             "category": names[c], "category_id": c, "total": total, "transaction_count": count}
+            for (g, p, d, c), (total, count) in self.buckets.items()
+        ]
+
+
+def _rebuild_documents(conn, intern):
+    # Normalize every transaction, then rebuild each document's summaries and rollups from it
+    conn.execute(spending_summary.delete())
+    conn.execute(received_summary.delete())
+    conn.execute(document_rollup.delete())
+
+    def flush(pdf_id, aggregate):
+        for table, column, summary in ((spending_summary, 'total_spent', aggregate.spending),
+                                       (received_summary, 'total_received', aggregate.received)):
+            rows = [{"pdf_id": pdf_id, "category": intern.names[cp], "counterparty_id": cp,
+                     column: round(total, 2), "transaction_count": count}
+                    for cp, (total, count) in summary.items()]
+            if rows:
+                conn.execute(table.insert(), rows)
+        rows = aggregate.rollup_rows("pdf_id", pdf_id, intern.names)
+        if rows:
+            conn.execute(document_rollup.insert(), rows)
+
+    update = transaction.update().where(transaction.c.id == sa.bindparam('_id')).values(
+        counterparty_id=sa.bindparam('_counterparty_id'), category_id=sa.bindparam('_category_id'))
+
+    current, aggregate = None, _Aggregate()
+    columns = ['id', 'pdf_id', 'details', 'completion_time', 'paid_in', 'withdraw']
+    for rows in _batches(conn, transaction, ['pdf_id', 'id'], columns):
+        updates = []
+        for row in rows:
+            if row.pdf_id != current:
+                if current is not None:
+                    flush(current, aggregate)
+                current, aggregate = row.pdf_id, _Aggregate()
+            counterparty, category = normalize_details(row.details)
+            counterparty_id, category_id = intern('counterparty', counterparty), intern('category', category)
+            updates.append({"_id": row.id, "_counterparty_id": counterparty_id, "_category_id": category_id})
+            aggregate.add(counterparty_id, category_id, row.completion_time, row.paid_in, row.withdraw)
+        conn.execute(update, updates)
+    if current is not None:
+        flush(current, aggregate)
+
+
+def _rebuild_customers(conn, intern):
+    conn.execute(customer_rollup.delete())
+
+    current, aggregate = None, _Aggregate()
+    columns = ['id', 'customer_id', 'details', 'completion_time', 'paid_in', 'withdraw']
+    for rows in _batches(conn, customer_ledger, ['customer_id', 'id'], columns):
+        for row in rows:
+            if row.customer_id != current:
+                if current is not None and aggregate.buckets:
+                    conn.execute(customer_rollup.insert(), aggregate.rollup_rows("customer_id", current, intern.names))
+                current, aggregate = row.customer_id, _Aggregate()
+            counterparty, category = normalize_details(row.details)
+            aggregate.add(intern('counterparty', counterparty), intern('category', category),
+                          row.completion_time, row.paid_in, row.withdraw)
+    if current is not None and aggregate.buckets:
+        conn.execute(customer_rollup.insert(), aggregate.rollup_rows("customer_id", current, intern.names))
+
+
+def upgrade():
+    op.create_table('interned_string',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('value', sa.String(length=255), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'value', name='uq_interned_string_kind_value')
+    )
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('counterparty_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('category_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_transaction_counterparty_id', 'interned_string', ['counterparty_id'], ['id'])
+        batch_op.create_foreign_key('fk_transaction_category_id', 'interned_string', ['category_id'], ['id'])
+    for table in ('spending_summary', 'received_summary'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('counterparty_id', sa.Integer(), nullable=True))
+    for table in ('document_rollup', 'customer_rollup'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('category_id', sa.Integer(), nullable=True))
+
+    # Summaries and rollups were grouped by raw details; rebuild them from
+    # the normalized transactions (they are derived data)
+    conn = op.get_bind()
+    intern = _Interner(conn)
+    _rebuild_documents(conn, intern)
+    _rebuild_customers(conn, intern)
+
+    for table in ('spending_summary', 'received_summary'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('counterparty_id', existing_type=sa.Integer(), nullable=False)
+            batch_op.create_foreign_key(f'fk_{table}_counterparty_id', 'interned_string', ['counterparty_id'], ['id'])
+            batch_op.drop_column('category')
+
+    for table, scope in (('document_rollup', 'pdf_id'), ('customer_rollup', 'customer_id')):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('category_id', existing_type=sa.Integer(), nullable=False)
+            batch_op.drop_constraint(f'uq_{table}_bucket', type_='unique')
+            batch_op.create_unique_constraint(f'uq_{table}_bucket', [scope, 'granularity', 'period_start', 'direction', 'category_id'])
+            batch_op.create_foreign_key(f'fk_{table}_category_id', 'interned_string', ['category_id'], ['id'])
+            batch_op.drop_column('category')
+
+
+def _restore_names(table, id_column):
+    # Copy the interned value back into the old string column
+    op.execute(table.update().values(category=sa.select(interned_string.c.value)
+                                     .where(interned_string.c.id == table.c[id_column]).scalar_subquery()))
+
+
+def downgrade():
+    for table, summary in (('spending_summary', spending_summary), ('received_summary', received_summary)):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('category', sa.VARCHAR(length=255), nullable=True))
+        _restore_names(summary, 'counterparty_id')
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('category', existing_type=sa.VARCHAR(length=255), nullable=False)
+            batch_op.drop_constraint(f'fk_{table}_counterparty_id', type_='foreignkey')
+            batch_op.drop_column('counterparty_id')
+
+    for table, rollup, scope in (('document_rollup', document_rollup, 'pdf_id'),
+                                 ('customer_rollup', customer_rollup, 'customer_id')):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('category', sa.VARCHAR(length=255), nullable=True))
+        _restore_names(rollup, 'category_id')
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('category', existing_type=sa.VARCHAR(length=255), nullable=False)
+            batch_op.drop_constraint(f'fk_{table}_category_id', type_='foreignkey')
+            batch_op.drop_constraint(f'uq_{table}_bucket', type_='unique')
+            batch_op.create_unique_constraint(f'uq_{table}_bucket', [scope, 'granularity', 'period_start', 'direction', 'category'])
+            batch_op.drop_column('category_id')
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_transaction_category_id', type_='foreignkey')
+        batch_op.drop_constraint('fk_transaction_counterparty_id', type_='foreignkey')
+        batch_op.drop_column('category_id')
+        batch_op.drop_column('counterparty_id')
+
+    op.drop_table('interned_string')
@@ -0,0 +1,52 @@
+"""Keep job passwords out of the database
+
+Revision ID: d41c7e2a9b3f
+Revises: bac960ba503b
+Create Date: 2026-10-18 18:05:12.331870
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41c7e2a9b3f'
+down_revision = 'bac960ba503b'
+branch_labels = None
+depends_on = None
+
+
+ingestion_job = sa.table(
+    'ingestion_job',
+    sa.column('status', sa.String),
+    sa.column('stage', sa.String),
+    sa.column('password', sa.String),
+    sa.column('error', sa.Text),
+    sa.column('finished_at', sa.DateTime)
+)
+
+
+def upgrade():
+    # Unfinished jobs that still depend on a stored password cannot run once it is dropped
+    op.execute(
+        ingestion_job.update()
+        .where(ingestion_job.c.password.isnot(None), ingestion_job.c.status.in_(['queued', 'running']))
+        .values(
+            status='failed',
+            stage='failed',
+            error="Statement password is no longer available (the server restarted); please re-upload",
+            finished_at=datetime.utcnow()
+        )
+    )
+
+    with op.batch_alter_table('ingestion_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('needs_password', sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.drop_column('password')
+
+
+def downgrade():
+    with op.batch_alter_table('ingestion_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('password', sa.String(), nullable=True))
+        batch_op.drop_column('needs_password')
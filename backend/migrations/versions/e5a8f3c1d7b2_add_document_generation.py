@@ -0,0 +1,26 @@
+"""Add document generation
+
+Revision ID: e5a8f3c1d7b2
+Revises: d41c7e2a9b3f
+Create Date: 2026-10-18 18:40:27.904113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a8f3c1d7b2'
+down_revision = 'd41c7e2a9b3f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pdf_document', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('generation', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('pdf_document', schema=None) as batch_op:
+        batch_op.drop_column('generation')
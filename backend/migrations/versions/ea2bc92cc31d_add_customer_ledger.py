@@ -0,0 +1,186 @@
+"""Add customer ledger
+
+Revision ID: ea2bc92cc31d
+Revises: 69e6737b878a
+Create Date: 2026-10-18 15:44:41.480446
+
+"""
+import re
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ea2bc92cc31d'
+down_revision = '69e6737b878a'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 5000
+
+customer = sa.table(
+    'customer',
+    sa.column('id', sa.Integer),
+    sa.column('mobile_number', sa.String),
+    sa.column('customer_name', sa.String),
+    sa.column('created_at', sa.DateTime)
+)
+
+customer_ledger = sa.table(
+    'customer_ledger',
+    sa.column('customer_id', sa.Integer),
+    sa.column('pdf_id', sa.Integer),
+    sa.column('receipt_no', sa.String),
+    sa.column('entry_seq', sa.SmallInteger),
+    sa.column('completion_time', sa.DateTime),
+    sa.column('details', sa.String),
+    sa.column('transaction_status', sa.String),
+    sa.column('paid_in', sa.Numeric(14, 2)),
+    sa.column('withdraw', sa.Numeric(14, 2)),
+    sa.column('balance', sa.Numeric(14, 2))
+)
+
+customer_details = sa.table(
+    'customer_details',
+    sa.column('id', sa.Integer),
+    sa.column('pdf_id', sa.Integer),
+    sa.column('customer_name', sa.String),
+    sa.column('mobile_number', sa.String)
+)
+
+transaction = sa.table(
+    'transaction',
+    sa.column('id', sa.Integer),
+    sa.column('pdf_id', sa.Integer),
+    sa.column('receipt_no', sa.String),
+    sa.column('completion_time', sa.DateTime),
+    sa.column('details', sa.String),
+    sa.column('transaction_status', sa.String),
+    sa.column('paid_in', sa.Numeric(14, 2)),
+    sa.column('withdraw', sa.Numeric(14, 2)),
+    sa.column('balance', sa.Numeric(14, 2))
+)
+
+
+def normalize_mobile_number(value):
+    # Frozen copy of parser.ledger.normalize_mobile_number as of this revision
+    if not value or "*" in value:
+        return None
+    digits = re.sub(r"\D", "", value)
+    if digits.startswith("254") and len(digits) == 12:
+        digits = "0" + digits[3:]
+    return digits if len(digits) >= 9 else None
+
+
+def _document_transactions(conn, pdf_id):
+    # A document's transactions in statement order, BATCH_SIZE rows at a time
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(transaction).where(transaction.c.pdf_id == pdf_id, transaction.c.id > last_id)
+            .order_by(transaction.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _backfill_ledger(conn):
+    """Merge the statements uploaded so far into the ledger, as ingestion would have.
+
+    Documents are merged in upload order, so a row seen in several statements
+    belongs to the first one; consecutive rows sharing a receipt number are
+    numbered by entry_seq exactly as parser.ledger.LedgerSequence does.
+    """
+    documents = {}  # normalized mobile number -> [(pdf_id, customer name)] in upload order
+    seen_pdfs = set()
+    details = conn.execute(
+        sa.select(customer_details.c.pdf_id, customer_details.c.customer_name, customer_details.c.mobile_number)
+        .order_by(customer_details.c.pdf_id, customer_details.c.id)
+    ).all()
+    for pdf_id, customer_name, mobile_number in details:
+        mobile = normalize_mobile_number(mobile_number)
+        if mobile is None or pdf_id in seen_pdfs:
+            continue
+        seen_pdfs.add(pdf_id)
+        documents.setdefault(mobile, []).append((pdf_id, customer_name))
+
+    now = datetime.utcnow()
+    for mobile, docs in documents.items():
+        conn.execute(customer.insert().values(mobile_number=mobile, customer_name=docs[0][1], created_at=now))
+        customer_id = conn.execute(sa.select(customer.c.id).where(customer.c.mobile_number == mobile)).scalar_one()
+
+        merged = set()  # (receipt_no, entry_seq) already in this customer's ledger
+        for pdf_id, _ in docs:
+            receipt_no, seq = None, 0
+            for rows in _document_transactions(conn, pdf_id):
+                entries = []
+                for row in rows:
+                    seq = seq + 1 if row.receipt_no == receipt_no else 0
+                    receipt_no = row.receipt_no
+                    if (receipt_no, seq) in merged:
+                        continue
+                    merged.add((receipt_no, seq))
+                    entries.append({
+                        "customer_id": customer_id,
+                        "pdf_id": pdf_id,
+                        "receipt_no": receipt_no,
+                        "entry_seq": seq,
+                        "completion_time": row.completion_time,
+                        "details": row.details,
+                        "transaction_status": row.transaction_status,
+                        "paid_in": row.paid_in,
+                        "withdraw": row.withdraw,
+                        "balance": row.balance
+                    })
+                if entries:
+                    conn.execute(customer_ledger.insert(), entries)
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('customer',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('mobile_number', sa.String(length=20), nullable=False),
+    sa.Column('customer_name', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('mobile_number')
+    )
+    op.create_table('customer_ledger',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('customer_id', sa.Integer(), nullable=False),
+    sa.Column('pdf_id', sa.Integer(), nullable=True),
+    sa.Column('receipt_no', sa.String(), nullable=False),
+    sa.Column('entry_seq', sa.SmallInteger(), nullable=False),
+    sa.Column('completion_time', sa.DateTime(), nullable=False),
+    sa.Column('details', sa.String(), nullable=False),
+    sa.Column('transaction_status', sa.String(), nullable=False),
+    sa.Column('paid_in', sa.Numeric(precision=14, scale=2), nullable=True),
+    sa.Column('withdraw', sa.Numeric(precision=14, scale=2), nullable=True),
+    sa.Column('balance', sa.Numeric(precision=14, scale=2), nullable=True),
+    sa.ForeignKeyConstraint(['customer_id'], ['customer.id'], ),
+    sa.ForeignKeyConstraint(['pdf_id'], ['pdf_document.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('customer_id', 'receipt_no', 'entry_seq', name='uq_customer_ledger_receipt')
+    )
+    with op.batch_alter_table('customer_ledger', schema=None) as batch_op:
+        batch_op.create_index('ix_customer_ledger_customer_time', ['customer_id', 'completion_time', 'id'], unique=False)
+
+    # ### end Alembic commands ###
+
+    _backfill_ledger(op.get_bind())
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('customer_ledger', schema=None) as batch_op:
+        batch_op.drop_index('ix_customer_ledger_customer_time')
+
+    op.drop_table('customer_ledger')
+    op.drop_table('customer')
+    # ### end Alembic commands ###
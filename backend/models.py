@@ -7,25 +7,52 @@ db = SQLAlchemy(metadata=metadata)
 
 # PDF Document model
 class PdfDocument(db.Model):
-    __tablename__ = 'pdf_document'  
+    __tablename__ = 'pdf_document'
+    __table_args__ = (
+        db.Index('ix_pdf_document_uploaded_at_id', 'uploaded_at', 'id'),  # /documents keyset pagination
+    )
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String, nullable=False)
-    content = db.Column(db.LargeBinary, nullable=False)
+    blob_key = db.Column(db.String(64), nullable=False)  # key of the PDF in the blob store
+    size = db.Column(db.BigInteger, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=True, unique=True, index=True)  # SHA-256 of content
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Bumped whenever the document's derived rows change; part of every cached response's key and ETag
+    generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+# Counterparty and category names, stored once and referenced by id
+class InternedString(db.Model):
+    __tablename__ = 'interned_string'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'value', name='uq_interned_string_kind_value'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # counterparty, category
+    value = db.Column(db.String(255), nullable=False)
 
 # M-PESA Transaction model
 class Transaction(db.Model):
     __tablename__ = 'transaction'
+    # Composite indexes for the keyset-paginated /transactions filters
+    __table_args__ = (
+        db.Index('ix_transaction_pdf_id_id', 'pdf_id', 'id'),
+        db.Index('ix_transaction_pdf_id_completion_time', 'pdf_id', 'completion_time', 'id'),
+        db.Index('ix_transaction_pdf_id_status', 'pdf_id', 'transaction_status', 'id'),
+        db.Index('ix_transaction_pdf_id_paid_in', 'pdf_id', 'paid_in', 'id'),
+        db.Index('ix_transaction_pdf_id_withdraw', 'pdf_id', 'withdraw', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    pdf_id = db.Column(db.Integer, db.ForeignKey('pdf_document.id'), nullable=False, index=True)
+    pdf_id = db.Column(db.Integer, db.ForeignKey('pdf_document.id'), nullable=False)
 
     receipt_no = db.Column(db.String, nullable=False)
-    completion_time = db.Column(db.String, nullable=False)
+    completion_time = db.Column(db.DateTime, nullable=False)
     details = db.Column(db.String, nullable=False)
     transaction_status = db.Column(db.String, nullable=False)
-    paid_in = db.Column(db.Float, nullable=True)
-    withdraw = db.Column(db.Float, nullable=True)
-    balance = db.Column(db.Float, nullable=True)
+    paid_in = db.Column(db.Numeric(14, 2), nullable=True)
+    withdraw = db.Column(db.Numeric(14, 2), nullable=True)
+    balance = db.Column(db.Numeric(14, 2), nullable=True)
+    counterparty_id = db.Column(db.Integer, db.ForeignKey('interned_string.id'), nullable=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('interned_string.id'), nullable=True)
 
     document = db.relationship("PdfDocument", backref="transactions")
 
@@ -38,22 +65,32 @@ class SpendingSummary(db.Model):
     __tablename__ = 'spending_summary'
     id = db.Column(db.Integer, primary_key=True)
     pdf_id = db.Column(db.Integer, db.ForeignKey('pdf_document.id'), nullable=False, index=True)
-    category = db.Column(db.String(255), nullable=False)
-    total_spent = db.Column(db.Float, nullable=False)
+    counterparty_id = db.Column(db.Integer, db.ForeignKey('interned_string.id'), nullable=False)
+    total_spent = db.Column(db.Numeric(14, 2), nullable=False)
     transaction_count = db.Column(db.Integer, default=0)
 
     pdf = db.relationship('PdfDocument', backref=db.backref('spending_summaries', lazy=True))
+    counterparty = db.relationship('InternedString', lazy='joined')
+
+    @property
+    def category(self):
+        return self.counterparty.value
 
 # Received Summary model
 class ReceivedSummary(db.Model):
     __tablename__ = 'received_summary'
     id = db.Column(db.Integer, primary_key=True)
     pdf_id = db.Column(db.Integer, db.ForeignKey('pdf_document.id'), nullable=False, index=True)
-    category = db.Column(db.String(255), nullable=False)
-    total_received = db.Column(db.Float, nullable=False)
+    counterparty_id = db.Column(db.Integer, db.ForeignKey('interned_string.id'), nullable=False)
+    total_received = db.Column(db.Numeric(14, 2), nullable=False)
     transaction_count = db.Column(db.Integer, default=0)
 
     pdf = db.relationship('PdfDocument', backref=db.backref('received_summaries', lazy=True))
+    counterparty = db.relationship('InternedString', lazy='joined')
+
+    @property
+    def category(self):
+        return self.counterparty.value
 
 # Total Summary model
 class TotalSummary(db.Model):
@@ -61,8 +98,8 @@ class TotalSummary(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     pdf_id = db.Column(db.Integer, db.ForeignKey('pdf_document.id'), nullable=False, index=True)
     transaction_type = db.Column(db.String,nullable=False)
-    total_paid_in = db.Column(db.String, nullable=False)
-    total_paid_out = db.Column(db.String, nullable=False)
+    total_paid_in = db.Column(db.Numeric(14, 2), nullable=False)
+    total_paid_out = db.Column(db.Numeric(14, 2), nullable=False)
 
     document = db.relationship("PdfDocument", backref="total_summaries")
 
@@ -89,3 +126,83 @@ class DocumentExtras(db.Model):
     content = db.Column(db.Text, nullable=False)
 
     document = db.relationship("PdfDocument", backref="extras")
+
+# Background ingestion job (DB-backed queue for asynchronous uploads)
+class IngestionJob(db.Model):
+    __tablename__ = 'ingestion_job'
+    id = db.Column(db.Integer, primary_key=True)
+    pdf_id = db.Column(db.Integer, db.ForeignKey('pdf_document.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    needs_password = db.Column(db.Boolean, nullable=False, default=False)  # the password itself is only kept in memory
+    stage = db.Column(db.String(50), nullable=True)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    document = db.relationship("PdfDocument", backref="ingestion_jobs")
+
+
+# Customer identified by mobile number across all of their uploaded statements
+class Customer(db.Model):
+    __tablename__ = 'customer'
+    id = db.Column(db.Integer, primary_key=True)
+    mobile_number = db.Column(db.String(20), nullable=False, unique=True)
+    customer_name = db.Column(db.String, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+# Merged per-customer transaction history; overlapping statements add each receipt once
+class LedgerEntry(db.Model):
+    __tablename__ = 'customer_ledger'
+    __table_args__ = (
+        # entry_seq numbers rows sharing a receipt number (a payment and its charge)
+        db.UniqueConstraint('customer_id', 'receipt_no', 'entry_seq', name='uq_customer_ledger_receipt'),
+        db.Index('ix_customer_ledger_customer_time', 'customer_id', 'completion_time', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
+    pdf_id = db.Column(db.Integer, db.ForeignKey('pdf_document.id', ondelete='SET NULL'), nullable=True)  # first statement it was seen in
+    receipt_no = db.Column(db.String, nullable=False)
+    entry_seq = db.Column(db.SmallInteger, nullable=False, default=0)
+    completion_time = db.Column(db.DateTime, nullable=False)
+    details = db.Column(db.String, nullable=False)
+    transaction_status = db.Column(db.String, nullable=False)
+    paid_in = db.Column(db.Numeric(14, 2), nullable=True)
+    withdraw = db.Column(db.Numeric(14, 2), nullable=True)
+    balance = db.Column(db.Numeric(14, 2), nullable=True)
+
+    customer = db.relationship("Customer", backref="ledger_entries")
+
+
+# Time-bucketed totals per document, maintained incrementally during ingestion
+class DocumentRollup(db.Model):
+    __tablename__ = 'document_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('pdf_id', 'granularity', 'period_start', 'direction', 'category_id', name='uq_document_rollup_bucket'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    pdf_id = db.Column(db.Integer, db.ForeignKey('pdf_document.id'), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)  # day, week, month
+    period_start = db.Column(db.Date, nullable=False)
+    direction = db.Column(db.String(3), nullable=False)  # in, out
+    category_id = db.Column(db.Integer, db.ForeignKey('interned_string.id'), nullable=False)
+    total = db.Column(db.Numeric(14, 2), nullable=False)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Time-bucketed totals over a customer's merged ledger
+class CustomerRollup(db.Model):
+    __tablename__ = 'customer_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('customer_id', 'granularity', 'period_start', 'direction', 'category_id', name='uq_customer_rollup_bucket'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+    direction = db.Column(db.String(3), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('interned_string.id'), nullable=False)
+    total = db.Column(db.Numeric(14, 2), nullable=False)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
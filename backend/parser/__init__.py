@@ -1,9 +1 @@
-
-
-
-
-
-from .upload import *
-from .summary import *
-from .extract import *
-from .fetching import *
\ No newline at end of file
+"""Statement parsing, ingestion and the API blueprints; app.create_app registers them."""
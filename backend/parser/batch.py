@@ -0,0 +1,338 @@
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.utils import secure_filename
+from sqlalchemy.exc import IntegrityError
+from models import db, PdfDocument, IngestionJob
+from datetime import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import zipfile
+from parser.document import StatementDocument
+from parser.storage import get_blob_store, spool_upload, UploadTooLarge
+from parser.pipeline import ingest_statement, clear_document_analysis, discard_unreferenced_blob
+from parser.cache import invalidate_document
+from parser.metrics import collect_stage_timings, instrument_upload, log_timings, note, stage, UPLOAD_BYTES
+
+batch_bp = Blueprint("batch_bp", __name__)
+logger = logging.getLogger(__name__)
+
+
+class BatchFile:
+    """One statement of a batch upload and what happened to it."""
+
+    def __init__(self, index, filename, password=None):
+        self.index = index
+        self.filename = filename
+        self.password = password
+        self.spooled = None
+        self.duplicate_of = None
+        self.result = None
+
+    def fail(self, error):
+        self.result = {"status": "failed", "error": error}
+
+
+def _read_passwords(form):
+    # `passwords` is a JSON object of {filename: password}; `password` applies to the rest
+    passwords = json.loads(form.get('passwords') or '{}')
+    if not isinstance(passwords, dict):
+        raise ValueError("passwords must be a JSON object of {filename: password}")
+    default = form.get('password', '').strip() or None
+    return {name: str(value).strip() or None for name, value in passwords.items()}, default
+
+
+def collect_batch_files(uploads, passwords, default_password, max_files, max_bytes, directory, max_total_bytes=None):
+    """Spool every PDF of the request, expanding zip archives, into a list of BatchFile.
+
+    Each PDF is capped at `max_bytes`; raises UploadTooLarge once the spooled
+    PDFs together pass `max_total_bytes`.
+    """
+    items = []
+    spooled_bytes = 0
+
+    def add(name):
+        if len(items) >= max_files:
+            raise ValueError(f"A batch may contain at most {max_files} statements")
+        item = BatchFile(len(items), name, passwords.get(name, default_password))
+        items.append(item)
+        return item
+
+    def spool(item, stream):
+        nonlocal spooled_bytes
+        # Inflated zip members count too, so the batch limit also bounds disk use
+        remaining = max_total_bytes - spooled_bytes if max_total_bytes else None
+        batch_limited = remaining is not None and (not max_bytes or remaining < max_bytes)
+        try:
+            item.spooled = spool_upload(
+                stream,
+                max_bytes=max(remaining, 1) if batch_limited else max_bytes,
+                directory=directory
+            )
+        except UploadTooLarge as e:
+            if batch_limited:
+                raise UploadTooLarge(f"Batch exceeds the {max_total_bytes} byte upload limit") from None
+            item.fail(str(e))
+            return
+        spooled_bytes += item.spooled.size
+        if max_total_bytes and spooled_bytes > max_total_bytes:
+            raise UploadTooLarge(f"Batch exceeds the {max_total_bytes} byte upload limit")
+
+    try:
+        for upload in uploads:
+            name = upload.filename or ''
+            if name.lower().endswith('.zip'):
+                try:
+                    archive = zipfile.ZipFile(upload.stream)
+                except zipfile.BadZipFile:
+                    add(name).fail("Invalid zip archive")
+                    continue
+                with archive:
+                    for member in archive.infolist():
+                        member_name = os.path.basename(member.filename)
+                        if member.is_dir() or member_name.startswith('.') or not member_name.lower().endswith('.pdf'):
+                            continue
+                        item = add(member_name)
+                        # Sizes in the zip header can lie; the limit is enforced while inflating
+                        with archive.open(member) as stream:
+                            spool(item, stream)
+            elif name.lower().endswith('.pdf'):
+                spool(add(name), upload.stream)
+            else:
+                add(name).fail("File must be a PDF or a zip of PDFs")
+    except BaseException:
+        for item in items:
+            if item.spooled is not None:
+                item.spooled.close()
+        raise
+
+    # Identical statements in one batch are ingested once
+    first_by_hash = {}
+    for item in items:
+        if item.spooled is not None:
+            first = first_by_hash.setdefault(item.spooled.sha256, item)
+            if first is not item:
+                item.duplicate_of = first
+
+    return items
+
+
+def _ingest_batch_file(item, store, force, parallel_min_pages):
+    filename = secure_filename(item.filename)
+    content_hash = item.spooled.sha256
+
+    existing = PdfDocument.query.filter_by(content_hash=content_hash).first()
+    if existing:
+        job = IngestionJob.query.filter_by(pdf_id=existing.id).order_by(IngestionJob.id.desc()).first()
+        # Even with force, a queued or running job would ingest on top of our reprocess
+        if job and job.status in ('queued', 'running'):
+            return {"status": "processing", "id": existing.id, "job_id": job.id}
+        if not force and (job is None or job.status == 'done'):
+            return {"status": "existing", "id": existing.id}
+
+    try:
+        with stage("open"):
+            statement = StatementDocument(item.spooled.path)
+    except Exception:
+        return {"status": "failed", "error": "Invalid or corrupted PDF file."}
+
+    try:
+        # A savepoint per file: a bad statement rolls back alone, not the whole commit batch
+        with db.session.begin_nested():
+            if existing:
+                doc = existing
+                doc.filename = filename
+                doc.uploaded_at = datetime.utcnow()
+                clear_document_analysis(doc.id)
+            else:
+                doc = PdfDocument(
+                    filename=filename,
+                    blob_key=content_hash,
+                    size=item.spooled.size,
+                    content_hash=content_hash,
+                    uploaded_at=datetime.utcnow()
+                )
+                db.session.add(doc)
+            db.session.flush()
+            note(pdf_id=doc.id)
+
+            with stage("decrypt"):
+                statement.authenticate(item.password)
+            analysis = ingest_statement(doc.id, statement, parallel_min_pages=parallel_min_pages)
+            # Only a statement that ingested cleanly is moved into the store
+            if not existing:
+                store.move_file(content_hash, item.spooled.path)
+    finally:
+        statement.close()
+
+    return {
+        "status": "reprocessed" if existing else "created",
+        "id": doc.id,
+        "transaction_count": analysis["transaction_count"]
+    }
+
+
+def _batch_worker(app, pending, commit_size, force, parallel_min_pages):
+    # One app context, and so one session and connection, for the worker's whole run
+    with app.app_context():
+        store = get_blob_store()
+        uncommitted = []
+
+        def commit():
+            try:
+                with stage("commit"):
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("Committing batch upload failed")
+                for item in uncommitted:
+                    if item.result["status"] == "created":
+                        discard_unreferenced_blob(store, item.spooled.sha256)
+                    item.fail(str(e))
+                uncommitted.clear()
+                return
+            for item in uncommitted:
+                if item.result["status"] == "reprocessed":
+                    invalidate_document(item.result["id"])
+            uncommitted.clear()
+
+        try:
+            while True:
+                try:
+                    item = pending.get_nowait()
+                except queue.Empty:
+                    break
+
+                with collect_stage_timings() as timings:
+                    started = time.perf_counter()
+                    try:
+                        item.result = _ingest_batch_file(item, store, force, parallel_min_pages)
+                    except IntegrityError:
+                        item.fail("This statement is already being processed")
+                    except Exception as e:
+                        logger.exception("Batch upload of %s failed", item.filename)
+                        item.fail(str(e))
+                    log_timings(
+                        "batch_file",
+                        timings,
+                        filename=item.filename,
+                        status=item.result["status"],
+                        bytes=item.spooled.size,
+                        duration_ms=round((time.perf_counter() - started) * 1000, 2)
+                    )
+
+                if item.result["status"] in ("created", "reprocessed"):
+                    uncommitted.append(item)
+                    if len(uncommitted) >= commit_size:
+                        commit()
+            commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("Batch upload worker error")
+            for item in uncommitted:
+                item.fail(str(e))
+        finally:
+            db.session.remove()
+
+
+def process_batch(app, items, workers, commit_size, force=False, parallel_min_pages=None):
+    """Ingest the spooled files of a batch on a bounded pool of worker threads.
+
+    Each worker commits every `commit_size` documents. Page parsing is sent
+    to the shared parse process pool, so the workers overlap their database
+    writes with parsing on other cores.
+    """
+    pending = queue.Queue()
+    for item in items:
+        if item.spooled is not None and item.duplicate_of is None:
+            pending.put(item)
+
+    threads = [
+        threading.Thread(
+            target=_batch_worker,
+            args=(app, pending, commit_size, force, parallel_min_pages),
+            name=f"batch-worker-{n}",
+            daemon=True
+        )
+        for n in range(max(1, min(workers, pending.qsize())))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for item in items:
+        if item.result is None and item.duplicate_of is None:
+            item.fail("The statement was not processed")  # its worker stopped early
+    for item in items:
+        if item.duplicate_of is not None:
+            first = item.duplicate_of.result
+            item.result = {**first, "duplicate_of": item.duplicate_of.index} if first["status"] != "failed" else dict(first)
+
+
+def _serialize_item(item):
+    return {"index": item.index, "filename": item.filename, **item.result}
+
+
+@batch_bp.route('/upload/batch', methods=['POST'])
+@instrument_upload("batch")
+def upload_batch():
+    uploads = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not uploads:
+        return jsonify({"error": "No files provided"}), 400
+
+    try:
+        passwords, default_password = _read_passwords(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    force = request.form.get('force', request.args.get('force', ''))
+    force = force.lower() in ('1', 'true', 'yes') or current_app.config.get('UPLOAD_FORCE_REPROCESS', False)
+
+    config = current_app.config
+    items = []
+    try:
+        try:
+            with stage("spool"):
+                items = collect_batch_files(
+                    uploads,
+                    passwords,
+                    default_password,
+                    max_files=config.get('BATCH_UPLOAD_MAX_FILES', 100),
+                    max_bytes=config.get('UPLOAD_MAX_BYTES'),
+                    directory=get_blob_store().spool_dir(),
+                    max_total_bytes=config.get('BATCH_UPLOAD_MAX_BYTES')
+                )
+        except (ValueError, UploadTooLarge) as e:
+            return jsonify({"error": str(e)}), 413
+        received = sum(item.spooled.size for item in items if item.spooled is not None)
+        UPLOAD_BYTES.inc(received)
+        note(files=len(items), bytes=received)
+
+        process_batch(
+            current_app._get_current_object(),
+            items,
+            workers=config.get('BATCH_UPLOAD_WORKERS', 4),
+            commit_size=config.get('BATCH_UPLOAD_COMMIT_SIZE', 10),
+            force=force,
+            parallel_min_pages=config.get('BATCH_PARSE_MIN_PAGES', 1)
+        )
+
+    except Exception as e:
+        logger.exception("Batch upload failed")
+        return jsonify({"error": str(e)}), 500
+
+    finally:
+        for item in items:
+            if item.spooled is not None:
+                item.spooled.close()
+
+    results = [_serialize_item(item) for item in items]
+    failed = sum(1 for result in results if result["status"] == "failed")
+    return jsonify({
+        "files": results,
+        "succeeded": len(results) - failed,
+        "failed": failed
+    }), 207 if failed else 200
@@ -0,0 +1,209 @@
+from flask import current_app
+from sqlalchemy import insert, select, tuple_
+from models import db, Transaction, SpendingSummary, ReceivedSummary, TotalSummary
+import io
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _copy_value(value):
+    # PostgreSQL COPY text format: tab separated, \N for NULL
+    if value is None:
+        return '\\N'
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+def _copy_supported(connection):
+    if not current_app.config.get('BULK_INSERT_USE_COPY', True):
+        return False
+    return connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2'
+
+
+def _copy_rows(connection, table, columns, rows):
+    preparer = connection.dialect.identifier_preparer
+    column_list = ", ".join(preparer.quote(c) for c in columns)
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(row.get(c)) for c in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {preparer.format_table(table)} ({column_list}) FROM STDIN",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+def bulk_insert(model, rows, batch_size=None):
+    """Insert plain dict rows for `model` inside the current session transaction.
+
+    Uses PostgreSQL COPY when psycopg2 is the driver, otherwise batched
+    executemany INSERTs. No ORM objects are built and no ids are returned.
+    """
+    if not rows:
+        return 0
+
+    table = model.__table__
+    connection = db.session.connection()
+
+    if _copy_supported(connection):
+        _copy_rows(connection, table, list(rows[0].keys()), rows)
+        return len(rows)
+
+    batch_size = batch_size or current_app.config.get('BULK_INSERT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    statement = insert(table)
+    for start in range(0, len(rows), batch_size):
+        connection.execute(statement, rows[start:start + batch_size])
+    return len(rows)
+
+
+def _conflict_insert(connection):
+    # Dialects with INSERT ... ON CONFLICT DO NOTHING
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif connection.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def _existing_keys(connection, table, key_names, keys):
+    key_columns = [table.c[name] for name in key_names]
+    return {tuple(row) for row in connection.execute(select(*key_columns).where(tuple_(*key_columns).in_(keys)))}
+
+
+def bulk_insert_ignore(model, rows, conflict_columns, batch_size=None):
+    """Insert dict rows for `model`, skipping rows that already exist.
+
+    `conflict_columns` must be covered by a unique constraint. Uses
+    ON CONFLICT DO NOTHING where the dialect has it; elsewhere the existing
+    keys of each batch are looked up first. Returns the conflict keys of
+    the rows that were actually inserted.
+    """
+    inserted = []
+    if not rows:
+        return inserted
+
+    table = model.__table__
+    connection = db.session.connection()
+    batch_size = batch_size or current_app.config.get('BULK_INSERT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    dialect_insert = _conflict_insert(connection)
+    key_columns = [table.c[name] for name in conflict_columns]
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        if dialect_insert is not None:
+            statement = dialect_insert(table).on_conflict_do_nothing(index_elements=conflict_columns) \
+                .returning(*key_columns)
+            inserted.extend(tuple(row) for row in connection.execute(statement, batch))
+            continue
+
+        keys = [tuple(row[name] for name in conflict_columns) for row in batch]
+        existing = _existing_keys(connection, table, conflict_columns, keys)
+        missing = [row for row, key in zip(batch, keys) if key not in existing]
+        if missing:
+            connection.execute(insert(table), missing)
+            inserted.extend(key for key in keys if key not in existing)
+    return inserted
+
+
+def bulk_upsert_add(model, rows, key_columns, add_columns, batch_size=None):
+    """Insert dict rows for `model`, adding `add_columns` onto rows that already exist.
+
+    Used for counters and running totals. Each batch must not repeat a key.
+    """
+    if not rows:
+        return
+
+    table = model.__table__
+    connection = db.session.connection()
+    batch_size = batch_size or current_app.config.get('BULK_INSERT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    dialect_insert = _conflict_insert(connection)
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        if dialect_insert is not None:
+            statement = dialect_insert(table)
+            statement = statement.on_conflict_do_update(
+                index_elements=key_columns,
+                set_={name: table.c[name] + statement.excluded[name] for name in add_columns}
+            )
+            connection.execute(statement, batch)
+            continue
+
+        keys = [tuple(row[name] for name in key_columns) for row in batch]
+        existing = _existing_keys(connection, table, key_columns, keys)
+        for row, key in zip(batch, keys):
+            if key in existing:
+                connection.execute(
+                    table.update()
+                    .where(*[table.c[name] == row[name] for name in key_columns])
+                    .values({name: table.c[name] + row[name] for name in add_columns})
+                )
+        missing = [row for row, key in zip(batch, keys) if key not in existing]
+        if missing:
+            connection.execute(insert(table), missing)
+
+
+def save_transactions(pdf_id, transactions):
+    return bulk_insert(Transaction, [
+        {
+            "pdf_id": pdf_id,
+            "receipt_no": txn['receipt_no'],
+            "completion_time": txn['completion_time'],
+            "details": txn['details'],
+            "transaction_status": txn['transaction_status'],
+            "paid_in": txn['paid_in'],
+            "withdraw": txn['withdrawn'],
+            "balance": txn['balance'],
+            "counterparty_id": txn.get('counterparty_id'),
+            "category_id": txn.get('category_id')
+        }
+        for txn in transactions
+    ])
+
+
+def save_spending_summary(pdf_id, summary):
+    return bulk_insert(SpendingSummary, [
+        {
+            "pdf_id": pdf_id,
+            "counterparty_id": counterparty_id,
+            "total_spent": round(values['total'], 2),
+            "transaction_count": values['count']
+        }
+        for counterparty_id, values in summary.items()
+    ])
+
+
+def save_received_summary(pdf_id, summary):
+    return bulk_insert(ReceivedSummary, [
+        {
+            "pdf_id": pdf_id,
+            "counterparty_id": counterparty_id,
+            "total_received": round(values['total'], 2),
+            "transaction_count": values['count']
+        }
+        for counterparty_id, values in summary.items()
+    ])
+
+
+def save_total_summary(pdf_id, rows):
+    return bulk_insert(TotalSummary, [
+        {
+            "pdf_id": pdf_id,
+            "transaction_type": row['transaction_type'],
+            "total_paid_in": row['total_paid_in'],
+            "total_paid_out": row['total_paid_out']
+        }
+        for row in rows
+    ])
@@ -0,0 +1,208 @@
+from flask import current_app, request, Response
+from models import db, PdfDocument
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import logging
+import threading
+
+try:
+    import redis
+except ImportError:  # optional: only needed for RESPONSE_CACHE=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    def __init__(self, body, etag, mimetype='application/json'):
+        self.body = body
+        self.etag = etag
+        self.mimetype = mimetype
+
+    @property
+    def size(self):
+        return len(self.body) + len(self.etag)
+
+
+class ResponseCache:
+    """Cache of rendered per-document responses, keyed by (pdf_id, endpoint).
+
+    `endpoint` includes the query string when there is one, and the
+    document's generation: a reprocess bumps it, so entries of the old
+    generation are never read again by any process, even one whose local
+    cache was not invalidated. They go away under memory pressure, or
+    right away in the process that called invalidate().
+    """
+
+    def get(self, pdf_id, endpoint):
+        raise NotImplementedError
+
+    def set(self, pdf_id, endpoint, entry):
+        raise NotImplementedError
+
+    def invalidate(self, pdf_id):
+        raise NotImplementedError
+
+
+class NullResponseCache(ResponseCache):
+    def get(self, pdf_id, endpoint):
+        return None
+
+    def set(self, pdf_id, endpoint, entry):
+        pass
+
+    def invalidate(self, pdf_id):
+        pass
+
+
+class LocalResponseCache(ResponseCache):
+    # In-process LRU bounded by the total size of the cached bodies.
+    # Each process keeps its own copy; the generation in the key keeps them all current.
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pdf_id, endpoint):
+        with self._lock:
+            entry = self._entries.get((pdf_id, endpoint))
+            if entry is not None:
+                self._entries.move_to_end((pdf_id, endpoint))
+            return entry
+
+    def set(self, pdf_id, endpoint, entry):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop((pdf_id, endpoint), None)
+            if old is not None:
+                self.current_bytes -= old.size
+            self._entries[(pdf_id, endpoint)] = entry
+            self.current_bytes += entry.size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.size
+
+    def invalidate(self, pdf_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == pdf_id]:
+                self.current_bytes -= self._entries.pop(key).size
+
+
+class RedisResponseCache(ResponseCache):
+    # One hash per document, so invalidation is a single DEL
+    def __init__(self, url, prefix='mpesa:responses:', ttl=None):
+        if redis is None:
+            raise RuntimeError("RESPONSE_CACHE=redis requires the 'redis' package (see requirements-optional.txt)")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, pdf_id):
+        return f"{self.prefix}{pdf_id}"
+
+    def get(self, pdf_id, endpoint):
+        value = self.client.hget(self._key(pdf_id), endpoint)
+        if value is None:
+            return None
+        etag, _, body = value.partition(b'\n')
+        return CachedResponse(body, etag.decode())
+
+    def set(self, pdf_id, endpoint, entry):
+        key = self._key(pdf_id)
+        pipe = self.client.pipeline()
+        pipe.hset(key, endpoint, entry.etag.encode() + b'\n' + entry.body)
+        if self.ttl:
+            pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def invalidate(self, pdf_id):
+        self.client.delete(self._key(pdf_id))
+
+
+_backends = {
+    'none': lambda app: NullResponseCache(),
+    'local': lambda app: LocalResponseCache(app.config.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+    'redis': lambda app: RedisResponseCache(app.config['RESPONSE_CACHE_URL'], ttl=app.config.get('RESPONSE_CACHE_TTL')),
+}
+
+
+def register_response_cache(name, factory):
+    """Register a backend factory `factory(app) -> ResponseCache` under `name`."""
+    _backends[name] = factory
+
+
+def get_response_cache(app=None):
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('response_cache')
+    if cache is None:
+        backend = app.config.get('RESPONSE_CACHE', 'local')
+        if backend not in _backends:
+            raise ValueError(f"Unknown response cache backend: {backend}")
+        cache = _backends[backend](app)
+        app.extensions['response_cache'] = cache
+    return cache
+
+
+def invalidate_document(pdf_id):
+    # Frees this process's entries (and the shared ones, for Redis) right after
+    # the commit; other processes already miss them through the bumped generation
+    try:
+        get_response_cache().invalidate(pdf_id)
+    except Exception:
+        logger.exception("Invalidating cached responses for document %s failed", pdf_id)
+
+
+def _respond(entry):
+    if request.if_none_match.contains(entry.etag):
+        response = Response(status=304)
+    else:
+        response = Response(entry.body, status=200, mimetype=entry.mimetype)
+    response.set_etag(entry.etag)
+    # Clients must revalidate, since a reprocess replaces the document's data
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def cached_document_response(view):
+    """Serve a per-document GET endpoint from the response cache with ETags.
+
+    Only 200 responses are cached; errors such as a 404 for a document that
+    is still being ingested are always recomputed.
+    """
+    @wraps(view)
+    def wrapper(pdf_id, **kwargs):
+        # One primary-key lookup per request: an unknown document goes straight to the view (404)
+        generation = db.session.query(PdfDocument.generation).filter_by(id=pdf_id).scalar()
+        if generation is None:
+            return view(pdf_id, **kwargs)
+
+        cache = get_response_cache()
+        endpoint = f"{request.endpoint}@{generation}"
+        if request.query_string:
+            # Endpoints with options (field selectors, limits) cache each variant
+            endpoint += '?' + request.query_string.decode()
+
+        try:
+            entry = cache.get(pdf_id, endpoint)
+        except Exception:
+            logger.exception("Reading the response cache failed")
+            entry = None
+        if entry is not None:
+            return _respond(entry)
+
+        response = current_app.make_response(view(pdf_id, **kwargs))
+        if response.status_code != 200 or response.is_streamed:
+            return response
+
+        body = response.get_data()
+        entry = CachedResponse(body, f"{generation}-{hashlib.sha256(body).hexdigest()[:32]}", response.mimetype)
+        try:
+            cache.set(pdf_id, endpoint, entry)
+        except Exception:
+            logger.exception("Writing the response cache failed")
+        return _respond(entry)
+
+    return wrapper
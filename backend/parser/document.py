@@ -0,0 +1,80 @@
+class StatementDocument:
+    """An uploaded statement opened and decrypted once and shared by every extractor.
+
+    Page text, blocks and words are cached on first access so the transaction,
+    metadata and summary-table passes never re-parse the same page.
+    """
+
+    def __init__(self, source):
+        # A filesystem path is opened by MuPDF directly, without a Python-side copy.
+        # Keeping the path lets worker processes reopen the file for parallel parsing.
+        self.path = source if isinstance(source, str) else None
+        self.password = None
+        # Imported on first use: processes that only serve the read API never load MuPDF
+        import fitz
+        if isinstance(source, str):
+            self.doc = fitz.open(source, filetype='pdf')
+        else:
+            self.doc = fitz.open(stream=source, filetype='pdf')
+        self._text = {}
+        self._blocks = {}
+        self._words = {}
+
+    def authenticate(self, password=None):
+        if self.doc.is_encrypted:
+            if not password or not self.doc.authenticate(password):
+                raise Exception("PDF decryption failed")
+            self.password = password
+        return self
+
+    @property
+    def page_count(self):
+        return self.doc.page_count
+
+    def _index(self, index):
+        return index + self.page_count if index < 0 else index
+
+    def page_text(self, index, cache=True):
+        index = self._index(index)
+        if index in self._text:
+            return self._text[index]
+        text = self.doc[index].get_text()
+        if cache:
+            self._text[index] = text
+        return text
+
+    def page_blocks(self, index):
+        index = self._index(index)
+        if index not in self._blocks:
+            self._blocks[index] = self.doc[index].get_text("blocks")
+        return self._blocks[index]
+
+    def page_words(self, index, cache=True):
+        index = self._index(index)
+        if index in self._words:
+            return self._words[index]
+        words = self.doc[index].get_text("words")
+        if cache:
+            self._words[index] = words
+        return words
+
+    def close(self):
+        self.doc.close()
+        self._text.clear()
+        self._blocks.clear()
+        self._words.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_statement(source, password=None):
+    return StatementDocument(source).authenticate(password)
+
+
+def open_stored_statement(store, key, password=None):
+    path = store.local_path(key)
+    return open_statement(path if path else store.read(key), password)
@@ -0,0 +1,171 @@
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from models import db, PdfDocument, Transaction, IngestionJob, InternedString
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+import csv
+import io
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for format=parquet
+    pa = pq = None
+
+export_bp = Blueprint("export_bp", __name__)
+
+EXPORT_COLUMNS = [
+    "id", "receipt_no", "completion_time", "details", "transaction_status",
+    "paid_in", "withdrawn", "balance", "counterparty", "category"
+]
+
+
+def iter_export_batches(pdf_id, batch_size):
+    """Yield a document's transactions as lists of row tuples, `batch_size` rows at a time.
+
+    Rows come from a server-side cursor, so only one batch is held in memory.
+    """
+    counterparty = aliased(InternedString)
+    category = aliased(InternedString)
+    query = select(
+        Transaction.id,
+        Transaction.receipt_no,
+        Transaction.completion_time,
+        Transaction.details,
+        Transaction.transaction_status,
+        Transaction.paid_in,
+        Transaction.withdraw,
+        Transaction.balance,
+        counterparty.value,
+        category.value
+    ).outerjoin(counterparty, counterparty.id == Transaction.counterparty_id) \
+        .outerjoin(category, category.id == Transaction.category_id) \
+        .where(Transaction.pdf_id == pdf_id).order_by(Transaction.id) \
+        .execution_options(stream_results=True, yield_per=batch_size)
+
+    for partition in db.session.execute(query).partitions():
+        yield [tuple(row) for row in partition]
+
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(row[:2] + (row[2].isoformat(sep=" "),) + row[3:] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _ndjson_chunks(batches):
+    dumps = current_app.json.dumps
+    for rows in batches:
+        yield "".join(
+            dumps({
+                **dict(zip(EXPORT_COLUMNS, row)),
+                "completion_time": row[2].isoformat(sep=" "),
+                # Decimal amounts are written as strings so no precision is lost
+                "paid_in": _decimal_text(row[5]),
+                "withdrawn": _decimal_text(row[6]),
+                "balance": _decimal_text(row[7])
+            }) + "\n"
+            for row in rows
+        )
+
+
+def _decimal_text(value):
+    return str(value) if value is not None else None
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file that hands back whatever was written since the last take()
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema():
+    amount = pa.decimal128(14, 2)
+    return pa.schema([
+        ("id", pa.int64()),
+        ("receipt_no", pa.string()),
+        ("completion_time", pa.timestamp("ms")),
+        ("details", pa.string()),
+        ("transaction_status", pa.string()),
+        ("paid_in", amount),
+        ("withdrawn", amount),
+        ("balance", amount),
+        ("counterparty", pa.string()),
+        ("category", pa.string())
+    ])
+
+
+def _parquet_chunks(batches):
+    # Each batch becomes one row group; its bytes are sent as soon as it is written
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for rows in batches:
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            ))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+EXPORT_FORMATS = {
+    "csv": (_csv_chunks, "text/csv", "csv"),
+    "ndjson": (_ndjson_chunks, "application/x-ndjson", "ndjson"),
+    "parquet": (_parquet_chunks, "application/vnd.apache.parquet", "parquet"),
+}
+
+
+@export_bp.route("/documents/<int:pdf_id>/export", methods=["GET"])
+def export_document(pdf_id):
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    if export_format == "parquet" and pq is None:
+        return jsonify({"error": "Parquet export requires the 'pyarrow' package (see requirements-optional.txt)"}), 501
+
+    doc = db.session.get(PdfDocument, pdf_id)
+    if not doc:
+        return jsonify({"error": "Document not found"}), 404
+
+    job = IngestionJob.query.filter_by(pdf_id=pdf_id).order_by(IngestionJob.id.desc()).first()
+    if job and job.status in ('queued', 'running'):
+        return jsonify({"error": "Document is still being processed"}), 409
+
+    render, mimetype, extension = EXPORT_FORMATS[export_format]
+    batches = iter_export_batches(pdf_id, current_app.config.get('EXPORT_BATCH_SIZE', 10000))
+    filename = f"{os.path.splitext(doc.filename)[0] or 'statement'}-transactions.{extension}"
+
+    response = Response(stream_with_context(render(batches)), status=200, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -1,17 +1,27 @@
-from flask import Flask, request, jsonify, Blueprint
+from flask import Flask, request, jsonify, Blueprint, current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.utils import secure_filename
 from models import db, PdfDocument, Transaction, CustomerDetails, DocumentExtras, TotalSummary
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
 import os
-from collections import defaultdict
+from collections import defaultdict, deque
 from sqlalchemy import func
+from parser.bulk import save_total_summary
+from parser.document import open_statement
+from parser.layout import find_table_layout, page_rows
+from config import TRANSACTION_ENGINES
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import statistics
+import threading
 import re
 from models import db, CustomerDetails, DocumentExtras, TotalSummary, Transaction
-import fitz
 from collections import defaultdict
 
 extract_bp = Blueprint("extract_bp", __name__)
+logger = logging.getLogger(__name__)
 
 
 
@@ -33,14 +43,10 @@ def calculate_duration_months(period_str):
                 raise ValueError(f"Failed to parse dates in period: {period_str} — {e}")
     return 0
 
-def extract_metadata(pdf_id, pdf_bytes, password=None):
-    doc = fitz.open(stream=pdf_bytes, filetype='pdf')
-    if doc.is_encrypted:
-        if not password or not doc.authenticate(password):
-            raise Exception("PDF decryption failed")
-
-    first_page_text = doc[0].get_text()
-    last_page_text = doc[-1].get_text()
+def parse_metadata(statement):
+    """Read the customer details and footer notes of a statement without touching the database."""
+    first_page_text = statement.page_text(0)
+    last_page_text = statement.page_text(-1)
 
     name_match = re.search(r"Customer Name\s*:\s*(.*)", first_page_text)
     phone_match = re.search(r"Mobile Number\s*:\s*(.*)", first_page_text)
@@ -55,40 +61,50 @@ def extract_metadata(pdf_id, pdf_bytes, password=None):
     # Compute duration in months
     duration_months = calculate_duration_months(period_str) if period_str != "Unknown" else None
 
+    return {
+        "customer_name": name_match.group(1).strip() if name_match else "Unknown",
+        "mobile_number": phone_match.group(1).strip() if phone_match else "Unknown",
+        "email_address": email_match.group(1).strip() if email_match else "Unknown",
+        "statement_period": period_str,
+        "request_date": request_date_str,
+        "statement_duration_months": duration_months,
+        "footer_notes": [
+            line.strip() for line in last_page_text.splitlines()
+            if "verification code" in line.lower() or "disclaimer" in line.lower()
+        ]
+    }
+
+
+def save_metadata(pdf_id, metadata):
     # Save customer details
-    db.session.add(CustomerDetails(
+    customer = CustomerDetails(
         pdf_id=pdf_id,
-        customer_name=name_match.group(1).strip() if name_match else "Unknown",
-        mobile_number=phone_match.group(1).strip() if phone_match else "Unknown",
-        email_address=email_match.group(1).strip() if email_match else "Unknown",
-        statement_period=period_str,
-        request_date=request_date_str,
-        statement_duration_months=duration_months
-    ))
+        customer_name=metadata["customer_name"],
+        mobile_number=metadata["mobile_number"],
+        email_address=metadata["email_address"],
+        statement_period=metadata["statement_period"],
+        request_date=metadata["request_date"],
+        statement_duration_months=metadata["statement_duration_months"]
+    )
+    db.session.add(customer)
 
     # Save footer notes
-    for line in last_page_text.splitlines():
-        if "verification code" in line.lower() or "disclaimer" in line.lower():
-            db.session.add(DocumentExtras(
-                pdf_id=pdf_id,
-                note_type="footer",
-                content=line.strip()
-            ))
-
-    db.session.commit()
+    for note in metadata["footer_notes"]:
+        db.session.add(DocumentExtras(
+            pdf_id=pdf_id,
+            note_type="footer",
+            content=note
+        ))
 
+    return customer
 
 
-def extract_summary_table(pdf_id, pdf_bytes, password=None):
-    
+def extract_metadata(pdf_id, statement):
+    return save_metadata(pdf_id, parse_metadata(statement))
 
-    doc = fitz.open(stream=pdf_bytes, filetype='pdf')
-    if doc.is_encrypted:
-        if not password or not doc.authenticate(password):
-            raise Exception("PDF decryption failed")
 
-    page = doc[0]  # Only check page 1
-    blocks = page.get_text("blocks")
+def parse_summary_table(statement):
+    blocks = statement.page_blocks(0)  # Only check page 1
     summary_rows = []
 
     header_y = None
@@ -103,8 +119,8 @@ def extract_summary_table(pdf_id, pdf_bytes, password=None):
             break
 
     if header_y is None:
-        print("[WARNING] Summary header not found on page 1")
-        return
+        logger.warning("Summary header not found on page 1")
+        return []
 
     # Step 2: Find the DETAILED STATEMENT block (to define end boundary)
     for block in blocks:
@@ -125,7 +141,7 @@ def extract_summary_table(pdf_id, pdf_bytes, password=None):
                 # print(f"[ROW BLOCK] {text}")
 
     # Step 4: Save clean rows
-    inserted_any = False
+    total_rows = []
     for line in summary_rows:
         numbers = re.findall(r"\d[\d,]*\.\d{2}", line)
         if len(numbers) < 2:
@@ -133,103 +149,435 @@ def extract_summary_table(pdf_id, pdf_bytes, password=None):
 
         transaction_type = re.sub(r"\d[\d,]*\.\d{2}", "", line)
         transaction_type = re.sub(r"\s+", " ", transaction_type.replace(":", "")).strip()
-        paid_in = numbers[0]
-        paid_out = numbers[1]
+        paid_in = clean_amount(numbers[0])
+        paid_out = clean_amount(numbers[1])
 
         # print(f"[INSERT] {transaction_type} | IN: {paid_in} | OUT: {paid_out}")
 
-        db.session.add(TotalSummary(
-            pdf_id=pdf_id,
-            transaction_type=transaction_type,
-            total_paid_in=paid_in,
-            total_paid_out=paid_out
-        ))
-        inserted_any = True
+        total_rows.append({
+            "transaction_type": transaction_type,
+            "total_paid_in": paid_in,
+            "total_paid_out": paid_out
+        })
+
+    return total_rows
 
-    if inserted_any:
-        db.session.commit()
+
+def save_summary_table(pdf_id, total_rows):
+    if total_rows:
+        save_total_summary(pdf_id, total_rows)
     else:
-        print("[WARNING] No TotalSummary rows inserted.")
+        logger.warning("No TotalSummary rows inserted for document %s", pdf_id)
+
+    return total_rows
+
+
+def extract_summary_table(pdf_id, statement):
+    return save_summary_table(pdf_id, parse_summary_table(statement))
 
 
 
+ZERO = Decimal("0.00")
+CENTS = Decimal("0.01")
+
+
 def clean_amount(value):
     try:
         if value in ["", "-", None]:
-            return 0.0
-        return float(value.replace(",", "").strip())
-    except Exception:
-        return 0.0
-
-def extract_transactions(pdf_bytes, password=None):
-    doc = fitz.open(stream=pdf_bytes, filetype='pdf')
-
-    if doc.is_encrypted:
-        if not password or not doc.authenticate(password):
-            raise Exception("PDF decryption failed")
-
-    transactions = []
-    status_keywords = r"^(Completed|Failed|Pending)$"
-    receipt_no_pattern = r"^[A-Z0-9]{10,}$"  # Covers receipt numbers like TFP39YYAD3, not just TF
-
-    for page in doc:
-        lines = page.get_text().split('\n')
-        i = 0
-        while i < len(lines):
-            # Match receipt number
-            if re.match(receipt_no_pattern, lines[i].strip()):
-                receipt_no = lines[i].strip()
-                i += 1
-                if i >= len(lines): break
+            return ZERO
+        return Decimal(value.replace(",", "").strip()).quantize(CENTS)
+    except (InvalidOperation, AttributeError):
+        return ZERO
 
-                completion_time = lines[i].strip()
-                i += 1
-                if i >= len(lines): break
-
-                # Look ahead for transaction status
-                details_lines = []
-                status_line_index = None
-                for j in range(i, min(i + 7, len(lines))):
-                    if re.match(status_keywords, lines[j].strip()):
-                        status_line_index = j
-                        break
-
-                if status_line_index is None:
-                    i += 1
-                    continue
 
-                details_lines = lines[i:status_line_index]
-                details = "\n".join([d.strip() for d in details_lines])
-                transaction_status = lines[status_line_index].strip()
-                i = status_line_index + 1
+# Statements print "2024-01-31 18:04:12"; the others are seen on older exports
+COMPLETION_TIME_FORMATS = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%Y-%m-%d %H:%M")
 
-                # Extract amount and balance
-                monetary_fields = []
-                while i < len(lines) and len(monetary_fields) < 2:
-                    line = lines[i].strip()
-                    if re.match(r'^-?[\d,]+(\.\d{1,2})?$', line) or line in ["", "-"]:
-                        monetary_fields.append(line)
-                        i += 1
-                    else:
-                        break
-
-                amount = clean_amount(monetary_fields[0]) if len(monetary_fields) > 0 else 0.0
-                balance = clean_amount(monetary_fields[1]) if len(monetary_fields) > 1 else 0.0
-
-                paid_in = amount if amount > 0 else 0.0
-                withdrawn = -amount if amount < 0 else 0.0
-                
-                transactions.append({
-                    "receipt_no": receipt_no,
-                    "completion_time": completion_time,
-                    "details": details,
-                    "transaction_status": transaction_status,
-                    "paid_in": paid_in,
-                    "withdrawn": withdrawn,
-                    "balance": balance
-                })
 
+def parse_completion_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in COMPLETION_TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+# Tokens are compiled once and matched against lines that are stripped once
+RECEIPT_NO_RE = re.compile(r"[A-Z0-9]{10,}")  # Covers receipt numbers like TFP39YYAD3, not just TF
+MONEY_RE = re.compile(r"-?[\d,]+(\.\d{1,2})?")
+STATUS_TOKENS = frozenset(("Completed", "Failed", "Pending"))
+EMPTY_MONEY_TOKENS = frozenset(("", "-"))
+DATE_LIKE_RE = re.compile(r"\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}")
+STATUS_LOOKAHEAD = 7  # The status must appear within this many lines of the completion time
+
+# Column titles repeated at the top of every page of the detailed statement
+TABLE_HEADER_LABELS = {
+    "Receipt No.", "Receipt No", "Completion Time", "Details", "Transaction Status",
+    "Paid In", "Paid in", "Withdrawn", "Withdraw", "Balance"
+}
+
+# Line parser states
+_SCAN, _TIME, _DETAILS, _MONEY = range(4)
+
+
+class UnreadableTransaction(ValueError):
+    """A transaction row whose completion time is a date in a format we cannot parse.
+
+    The statement is rejected as a whole: storing it without the row would
+    leave a silent gap in the customer's history.
+    """
+
+
+def _completion_time(receipt_no, value):
+    # A "time" with no date in it means the receipt number was a false match
+    # (e.g. an account number in the details): not a transaction
+    completed_at = parse_completion_time(value)
+    if completed_at is None and DATE_LIKE_RE.search(value):
+        raise UnreadableTransaction(f"Transaction {receipt_no} has an unreadable completion time: {value!r}")
+    return completed_at
+
+
+def _make_record(receipt_no, completion_time, details, transaction_status, monetary_fields):
+    # Values are typed here so they go to the database as DateTime/Numeric
+    completed_at = _completion_time(receipt_no, completion_time)
+    if completed_at is None:
+        return None
+    amount = clean_amount(monetary_fields[0]) if len(monetary_fields) > 0 else ZERO
+    balance = clean_amount(monetary_fields[1]) if len(monetary_fields) > 1 else ZERO
+
+    return {
+        "receipt_no": receipt_no,
+        "completion_time": completed_at,
+        "details": details,
+        "transaction_status": transaction_status,
+        "paid_in": amount if amount > 0 else ZERO,
+        "withdrawn": -amount if amount < 0 else ZERO,
+        "balance": balance
+    }
+
+
+def _parse_page_lines(lines):
+    """Parse one page of statement text with a single-pass state machine.
+
+    Returns (records, head, tail): the complete records on the page, the
+    lines before its first receipt number, and the lines of a record cut
+    off by the end of the page (or None) so it can be stitched to the next.
+    """
+    stripped = [line.strip() for line in lines]
+    n = len(stripped)
+    records = []
+    head_end = None
+    tail = None
+
+    state = _SCAN
+    start = details_start = status_index = 0
+    receipt_no = completion_time = None
+    monetary_fields = []
+    i = 0
+
+    while True:
+        if i >= n:
+            if state == _SCAN:
+                break
+            if state == _DETAILS and details_start < n:
+                # The status look-ahead ran off the page: keep the record for
+                # stitching and resume scanning after the first details line
+                if tail is None:
+                    tail = lines[start:]
+                state = _SCAN
+                i = details_start + 1
+                continue
+            tail = lines[start:]
+            break
+
+        line = stripped[i]
+
+        if state == _SCAN:
+            if RECEIPT_NO_RE.fullmatch(line):
+                if head_end is None:
+                    head_end = i
+                start = i
+                receipt_no = line
+                state = _TIME
+            i += 1
+
+        elif state == _TIME:
+            completion_time = line
+            details_start = i + 1
+            state = _DETAILS
+            i += 1
+
+        elif state == _DETAILS:
+            if line in STATUS_TOKENS:
+                status_index = i
+                monetary_fields = []
+                state = _MONEY
+                i += 1
+            elif i - details_start >= STATUS_LOOKAHEAD - 1:
+                # No status in the look-ahead window: not a transaction
+                state = _SCAN
+                i = details_start + 1
             else:
                 i += 1
 
-    return transactions
+        else:  # _MONEY: amount and balance
+            if line in EMPTY_MONEY_TOKENS or MONEY_RE.fullmatch(line):
+                monetary_fields.append(line)
+                i += 1
+                if len(monetary_fields) < 2:
+                    continue
+            record = _make_record(
+                receipt_no,
+                completion_time,
+                "\n".join(stripped[details_start:status_index]),
+                stripped[status_index],
+                monetary_fields
+            )
+            if record is not None:
+                records.append(record)
+            state = _SCAN
+
+    head = lines[:head_end] if head_end is not None else lines
+    return records, head, tail
+
+
+def _stitch_pages(page_results):
+    """Yield records page by page in order, completing records split across pages."""
+    pending = None
+
+    for records, head, tail in page_results:
+        if pending is not None:
+            continuation = [line for line in head if line.strip() not in TABLE_HEADER_LABELS]
+            yield from _parse_page_lines(pending + continuation)[0]
+        yield from records
+
+        pending = None
+        if tail is not None:
+            # get_text() ends every page with a newline; drop that artifact
+            pending = list(tail)
+            while pending and not pending[-1].strip():
+                pending.pop()
+
+    if pending:
+        yield from _parse_page_lines(pending)[0]
+
+
+# Every word of the column titles, to recognise the titles repeated on each page
+TABLE_HEADER_WORDS = frozenset(word for label in TABLE_HEADER_LABELS for word in label.split())
+
+
+def _word_record(lines):
+    # `lines` holds the text lines of each column of one transaction, in layout.COLUMNS order
+    receipt_no, completion_time, details, status, paid_in, withdrawn, balance = lines
+    transaction_status = " ".join(status)
+    if transaction_status not in STATUS_TOKENS:
+        return None
+    completed_at = _completion_time(receipt_no[0], " ".join(completion_time))
+    if completed_at is None:
+        return None
+
+    # Each amount has its own column, so the sign printed on withdrawals is not needed
+    return {
+        "receipt_no": receipt_no[0],
+        "completion_time": completed_at,
+        "details": "\n".join(details),
+        "transaction_status": transaction_status,
+        "paid_in": abs(clean_amount(" ".join(paid_in))),
+        "withdrawn": abs(clean_amount(" ".join(withdrawn))),
+        "balance": clean_amount(" ".join(balance))
+    }
+
+
+def _extend_lines(lines, cells):
+    for column, text in enumerate(cells):
+        if text:
+            lines[column].append(text)
+
+
+def _is_header_row(cells):
+    return sum(1 for text in cells if text) >= 3 and set(" ".join(cells).split()) <= TABLE_HEADER_WORDS
+
+
+def _parse_page_words(rows):
+    """Assemble one page's table rows (see parser.layout.page_rows) into transactions.
+
+    A row with a receipt number starts a transaction; rows right below it
+    with an empty receipt cell add their lines (wrapped details) to it.
+    Returns (records, continuation, last): the complete records, the rows
+    before the page's first receipt number that continue the previous
+    page's last record, and this page's last record, left open as its
+    details may continue on the next page.
+    """
+    # Everything above the column titles (page 1's header and summary table) is not part of the table
+    headers = [i for i, (_, _, cells) in enumerate(rows) if _is_header_row(cells)]
+    if headers:
+        rows = rows[headers[-1] + 1:]
+    if not rows:
+        return [], [], None
+    line_height = statistics.median(bottom - top for top, bottom, _ in rows)
+
+    complete = []
+    continuation = []
+    collecting = True
+    current = None
+    last_bottom = None
+    for top, bottom, cells in rows:
+        adjacent = last_bottom is None or top - last_bottom <= line_height
+        if RECEIPT_NO_RE.fullmatch(cells[0]):
+            if current is not None:
+                complete.append(current)
+            current = [[text] if text else [] for text in cells]
+            collecting = False
+        elif not cells[0] and adjacent and (current is not None or collecting):
+            if current is not None:
+                _extend_lines(current, cells)
+            else:
+                continuation.append(cells)
+        else:
+            # Anything else (page numbers, footers, stray text) ends the record above it
+            if current is not None:
+                complete.append(current)
+            current = None
+            collecting = False
+        last_bottom = bottom
+
+    records = [record for record in map(_word_record, complete) if record is not None]
+    return records, continuation, current
+
+
+def _stitch_word_pages(page_results):
+    """Yield records page by page in order, adding details that continue on the next page."""
+    pending = None
+
+    for records, continuation, last in page_results:
+        if pending is not None:
+            for cells in continuation:
+                _extend_lines(pending, cells)
+            if not records and last is None:
+                continue  # the page only holds more of the pending record's details
+            record = _word_record(pending)
+            if record is not None:
+                yield record
+        yield from records
+        pending = last
+
+    if pending is not None:
+        record = _word_record(pending)
+        if record is not None:
+            yield record
+
+
+def _parse_page(statement, index, layout, cache=False):
+    if layout is not None:
+        return _parse_page_words(page_rows(statement.page_words(index, cache=cache), layout))
+    return _parse_page_lines(statement.page_text(index, cache=cache).split('\n'))
+
+
+def _parse_page_range(source, password, start, stop, layout=None):
+    # Runs in a worker process: open the file independently and parse a page range
+    statement = open_statement(source, password)
+    try:
+        return [_parse_page(statement, i, layout) for i in range(start, stop)]
+    finally:
+        statement.close()
+
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def parse_pool_context():
+    """Start method for parser processes.
+
+    The web server, job and batch threads may hold locks at any moment, so
+    children are never forked from this process: the forkserver forks them
+    from a clean single-threaded process, spawn starts them from scratch.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # Forked children start with the parser already imported
+        context.set_forkserver_preload(["parser.extract"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _get_parse_pool(workers):
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=workers, mp_context=parse_pool_context())
+        return _parse_pool
+
+
+def start_parse_pool(app):
+    """Start the parse pool and its processes, e.g. right after a server forks its workers."""
+    workers = app.config.get('PARALLEL_PARSE_WORKERS', os.cpu_count() or 1)
+    if workers > 1:
+        _get_parse_pool(workers).submit(int).result()
+
+
+def _config(name, default):
+    return current_app.config.get(name, default) if has_app_context() else default
+
+
+def _parse_pages_parallel(statement, workers, layout=None):
+    pages = statement.page_count
+    chunk = max(1, min(-(-pages // workers), _config('PARALLEL_PARSE_CHUNK_PAGES', 16)))
+    ranges = [(start, min(start + chunk, pages)) for start in range(0, pages, chunk)]
+
+    # Keep only a few chunks in flight so results are consumed as they arrive
+    pool = _get_parse_pool(workers)
+    in_flight = deque()
+    for start, stop in ranges:
+        in_flight.append(pool.submit(_parse_page_range, statement.path, statement.password, start, stop, layout))
+        if len(in_flight) > workers:
+            yield from in_flight.popleft().result()
+    while in_flight:
+        yield from in_flight.popleft().result()
+
+
+def _iter_page_results(statement, layout=None):
+    last = statement.page_count - 1
+    for i in range(statement.page_count):
+        # Only the first and last pages are reread by the metadata extractors
+        yield _parse_page(statement, i, layout, cache=i in (0, last))
+
+
+def iter_transactions(statement, parallel_min_pages=None, parallel=True, engine=None):
+    """Yield transactions in statement order as each page is parsed.
+
+    `engine` overrides TRANSACTION_ENGINE: 'lines' reads each page's text
+    line by line, 'words' places each word in its table cell using the
+    column boundaries learned from the column titles (see parser.layout).
+    `parallel_min_pages` overrides PARALLEL_PARSE_MIN_PAGES for this call;
+    `parallel=False` always parses in this process (e.g. inside a pool worker).
+    """
+    engine = engine or _config('TRANSACTION_ENGINE', 'lines')
+    if engine not in TRANSACTION_ENGINES:
+        raise ValueError(f"Unknown transaction engine {engine!r}; expected one of {', '.join(TRANSACTION_ENGINES)}")
+
+    layout = None
+    if engine == "words":
+        layout = find_table_layout(statement)
+        if layout is None:
+            logger.warning("Transaction table column titles not found; parsing the statement line by line")
+
+    pages = statement.page_count
+    min_pages = parallel_min_pages if parallel_min_pages is not None else _config('PARALLEL_PARSE_MIN_PAGES', 40)
+    workers = _config('PARALLEL_PARSE_WORKERS', os.cpu_count() or 1)
+
+    # Large statements that can be reopened by path are split across a process pool
+    if parallel and workers > 1 and pages >= min_pages and statement.path:
+        page_results = _parse_pages_parallel(statement, workers, layout)
+    else:
+        page_results = _iter_page_results(statement, layout)
+
+    return _stitch_word_pages(page_results) if layout is not None else _stitch_pages(page_results)
+
+
+def extract_transactions(statement):
+    return list(iter_transactions(statement))
@@ -1,20 +1,27 @@
 from flask import Flask, request, jsonify, Blueprint
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.utils import secure_filename
-from models import db, PdfDocument, Transaction, SpendingSummary, ReceivedSummary, CustomerDetails, TotalSummary
-from datetime import datetime
+from models import db, PdfDocument, Transaction, SpendingSummary, ReceivedSummary, CustomerDetails, TotalSummary, DocumentExtras, InternedString
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
 import os
 from collections import defaultdict
+from sqlalchemy import and_, or_, tuple_, func
+from sqlalchemy.orm import load_only
+from parser.cache import cached_document_response
+from parser.serialize import json_amount, json_time, money_text, serialize_total_summary
+from parser.pagination import page_limit, decode_cursor, fetch_page, paginated_response, InvalidPageRequest
 
 fetching_bp = Blueprint("fetching_bp", __name__)
 
 
 @fetching_bp.route("/fetching/<int:pdf_id>", methods=["GET"])
+@cached_document_response
 def get_customer_details(pdf_id):
     customer = CustomerDetails.query.filter_by(pdf_id=pdf_id).first()
 
     if not customer:
-        return jsonify({"error":"Customer details not found"})
+        return jsonify({"error":"Customer details not found"}), 404
 
     return jsonify({
         "pdf_id": customer.pdf_id,
@@ -29,6 +36,7 @@ def get_customer_details(pdf_id):
 
 
 @fetching_bp.route("/summary/spending/<int:pdf_id>", methods=["GET"])
+@cached_document_response
 def summary_spending(pdf_id):
     spending = SpendingSummary.query.filter_by(pdf_id=pdf_id).all()
 
@@ -39,7 +47,7 @@ def summary_spending(pdf_id):
         {
             'pdf_id': entry.pdf_id,
             'category': entry.category,
-            'total_spent': entry.total_spent,
+            'total_spent': json_amount(entry.total_spent),
             'transaction_count': entry.transaction_count
         }
         for entry in spending
@@ -47,6 +55,7 @@ def summary_spending(pdf_id):
 
 
 @fetching_bp.route("/summary/received/<int:pdf_id>", methods=["GET"])
+@cached_document_response
 def summary_received(pdf_id):
     received = ReceivedSummary.query.filter_by(pdf_id=pdf_id).all()
 
@@ -57,7 +66,7 @@ def summary_received(pdf_id):
         {
             'pdf_id': entry.pdf_id,
             'category': entry.category,
-            'total_received': entry.total_received,
+            'total_received': json_amount(entry.total_received),
             'transaction_count': entry.transaction_count
         }
         for entry in received
@@ -66,7 +75,20 @@ def summary_received(pdf_id):
 
 @fetching_bp.route("/documents", methods=["GET"])
 def list_uploaded_documents():
-    documents = PdfDocument.query.options(load_only(PdfDocument.id, PdfDocument.filename, PdfDocument.uploaded_at)).order_by(PdfDocument.uploaded_at.desc()).all()
+    try:
+        limit = page_limit(request.args)
+        cursor = decode_cursor(request.args.get('cursor'), (datetime.fromisoformat, int))
+        after = tuple(cursor) if cursor else None
+    except (InvalidPageRequest, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Keyset pagination on (uploaded_at, id), newest first
+    query = PdfDocument.query.options(load_only(PdfDocument.id, PdfDocument.filename, PdfDocument.uploaded_at))
+    if after:
+        query = query.filter(tuple_(PdfDocument.uploaded_at, PdfDocument.id) < after)
+    query = query.order_by(PdfDocument.uploaded_at.desc(), PdfDocument.id.desc())
+
+    documents, next_cursor = fetch_page(query, limit, lambda doc: [doc.uploaded_at.isoformat(), doc.id])
 
     result = [
         {
@@ -76,11 +98,101 @@ def list_uploaded_documents():
         }
         for doc in documents
     ]
-    return jsonify(result)
+    return paginated_response(result, next_cursor)
+
+
+def _parse_time_bound(value, upper=False):
+    # Accepts a date or a full ISO timestamp; a bare upper date includes the whole day
+    parsed = datetime.fromisoformat(value)
+    if upper and len(value) == 10:
+        return parsed + timedelta(days=1), False
+    return parsed, True
+
+
+def _amount_arg(args, name):
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite():
+        raise InvalidPageRequest(f"{name} must be a number")
+    return amount
+
+
+@fetching_bp.route("/transactions/<int:pdf_id>", methods=["GET"])
+def list_transactions(pdf_id):
+    args = request.args
+    try:
+        limit = page_limit(args)
+        cursor = decode_cursor(args.get('cursor'), (int,))
+        after_id = cursor[0] if cursor else None
+        min_amount = _amount_arg(args, 'min_amount')
+        max_amount = _amount_arg(args, 'max_amount')
+        start = _parse_time_bound(args['from']) if args.get('from') else None
+        end = _parse_time_bound(args['to'], upper=True) if args.get('to') else None
+    except (InvalidPageRequest, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    direction = args.get('direction')
+    if direction not in (None, '', 'in', 'out'):
+        return jsonify({"error": "direction must be 'in' or 'out'"}), 400
+
+    query = Transaction.query.filter(Transaction.pdf_id == pdf_id)
+
+    if start:
+        query = query.filter(Transaction.completion_time >= start[0])
+    if end:
+        bound = end[0]
+        query = query.filter(Transaction.completion_time <= bound if end[1] else Transaction.completion_time < bound)
+
+    if args.get('status'):
+        query = query.filter(Transaction.transaction_status.in_(args['status'].split(',')))
+
+    # Amount filters apply to the column of the requested direction
+    amount_columns = {'in': [Transaction.paid_in], 'out': [Transaction.withdraw]}.get(
+        direction, [Transaction.paid_in, Transaction.withdraw])
+    if direction:
+        query = query.filter(amount_columns[0] > 0)
+    if min_amount is not None or max_amount is not None:
+        conditions = []
+        for column in amount_columns:
+            condition = column > 0
+            if min_amount is not None:
+                condition = and_(condition, column >= min_amount)
+            if max_amount is not None:
+                condition = and_(condition, column <= max_amount)
+            conditions.append(condition)
+        query = query.filter(or_(*conditions))
+
+    # Keyset pagination on id, which follows statement order
+    if after_id is not None:
+        query = query.filter(Transaction.id > after_id)
+    query = query.order_by(Transaction.id)
+
+    transactions, next_cursor = fetch_page(query, limit, lambda txn: [txn.id])
+
+    return paginated_response([
+        {
+            "id": txn.id,
+            "pdf_id": txn.pdf_id,
+            "receipt_no": txn.receipt_no,
+            "completion_time": json_time(txn.completion_time),
+            "details": txn.details,
+            "transaction_status": txn.transaction_status,
+            "paid_in": json_amount(txn.paid_in),
+            "withdrawn": json_amount(txn.withdraw),
+            "balance": json_amount(txn.balance)
+        }
+        for txn in transactions
+    ], next_cursor)
 
 
 
 @fetching_bp.route("/totalsummary/<int:pdf_id>", methods=["GET"])
+@cached_document_response
 def total_summary(pdf_id):
     total = TotalSummary.query.filter_by(pdf_id=pdf_id).all()
 
@@ -91,9 +203,101 @@ def total_summary(pdf_id):
         {
             'pdf_id': total_money.pdf_id,
             'transaction_type': total_money.transaction_type,
-            'total_paid_in': total_money.total_paid_in,
-            'total_paid_out': total_money.total_paid_out
+            'total_paid_in': money_text(total_money.total_paid_in),
+            'total_paid_out': money_text(total_money.total_paid_out)
         }
         for total_money in total
     ])
 
+
+OVERVIEW_SECTIONS = ("customer", "extras", "total_summary", "spending", "received")
+DEFAULT_TOP_CATEGORIES = 10
+MAX_TOP_CATEGORIES = 100
+
+
+def _top_categories(model, total_column, pdf_id, top):
+    # Top-N rows plus the section's category count and grand total, in one query
+    rows = db.session.query(
+        InternedString.value.label("category"),
+        total_column,
+        model.transaction_count,
+        func.count().over().label("category_count"),
+        func.sum(total_column).over().label("grand_total")
+    ).join(InternedString, InternedString.id == model.counterparty_id) \
+        .filter(model.pdf_id == pdf_id).order_by(total_column.desc(), model.id).limit(top).all()
+
+    return {
+        "category_count": rows[0].category_count if rows else 0,
+        "total": json_amount(rows[0].grand_total) if rows else 0.0,
+        "top": [
+            {
+                "category": row.category,
+                "total": json_amount(row[1]),
+                "transaction_count": row.transaction_count
+            }
+            for row in rows
+        ]
+    }
+
+
+@fetching_bp.route("/documents/<int:pdf_id>/overview", methods=["GET"])
+@cached_document_response
+def document_overview(pdf_id):
+    fields = request.args.get('fields')
+    sections = [f.strip() for f in fields.split(',') if f.strip()] if fields else list(OVERVIEW_SECTIONS)
+    unknown = [f for f in sections if f not in OVERVIEW_SECTIONS]
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    try:
+        top = int(request.args.get('top', DEFAULT_TOP_CATEGORIES))
+    except ValueError:
+        return jsonify({"error": "top must be an integer"}), 400
+    top = max(1, min(top, MAX_TOP_CATEGORIES))
+
+    doc = db.session.query(PdfDocument.id, PdfDocument.filename, PdfDocument.uploaded_at) \
+        .filter(PdfDocument.id == pdf_id).first()
+    if not doc:
+        return jsonify({"error": "Document not found"}), 404
+
+    # One query per requested section
+    result = {
+        "id": doc.id,
+        "filename": doc.filename,
+        "uploaded_at": json_time(doc.uploaded_at)
+    }
+
+    if "customer" in sections:
+        customer = CustomerDetails.query.filter_by(pdf_id=pdf_id).first()
+        result["customer"] = {
+            "customer_name": customer.customer_name,
+            "mobile_number": customer.mobile_number,
+            "email_address": customer.email_address,
+            "statement_period": customer.statement_period,
+            "request_date": customer.request_date,
+            "statement_duration_months": customer.statement_duration_months
+        } if customer else None
+
+    if "extras" in sections:
+        extras = DocumentExtras.query.filter_by(pdf_id=pdf_id).order_by(DocumentExtras.id).all()
+        result["extras"] = [{"note_type": e.note_type, "content": e.content} for e in extras]
+
+    if "total_summary" in sections:
+        rows = TotalSummary.query.filter_by(pdf_id=pdf_id).order_by(TotalSummary.id).all()
+        result["total_summary"] = serialize_total_summary([
+            {
+                "transaction_type": row.transaction_type,
+                "total_paid_in": row.total_paid_in,
+                "total_paid_out": row.total_paid_out
+            }
+            for row in rows
+        ])
+
+    if "spending" in sections:
+        result["spending"] = _top_categories(SpendingSummary, SpendingSummary.total_spent, pdf_id, top)
+
+    if "received" in sections:
+        result["received"] = _top_categories(ReceivedSummary, ReceivedSummary.total_received, pdf_id, top)
+
+    return jsonify(result), 200
+
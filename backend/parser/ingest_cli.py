@@ -0,0 +1,269 @@
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.utils import secure_filename
+from models import db, PdfDocument
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+import click
+import csv
+import hashlib
+import json
+import os
+import time
+from parser.document import open_statement
+from parser.extract import parse_metadata, parse_summary_table, iter_transactions, parse_pool_context
+from parser.pipeline import store_statement, discard_unreferenced_blob
+from parser.storage import get_blob_store
+
+CHECKPOINT_NAME = ".ingest-checkpoint.jsonl"
+
+
+def find_statements(directory):
+    """Return (relative path, absolute path) of every PDF under `directory`, in a stable order."""
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith('.pdf') and not name.startswith('.'):
+                path = os.path.join(root, name)
+                found.append((os.path.relpath(path, directory), path))
+    return found
+
+
+def load_password_manifest(path):
+    """Read {path or filename: password} from a JSON object or a two-column CSV."""
+    if path.lower().endswith('.json'):
+        with open(path) as f:
+            manifest = json.load(f)
+        if not isinstance(manifest, dict):
+            raise click.BadParameter("the JSON manifest must be an object of {path: password}")
+        return {str(name): str(password) for name, password in manifest.items()}
+
+    manifest = {}
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or row[0].strip().lower() in ('path', 'file', 'filename'):
+                continue
+            manifest[row[0].strip()] = row[1].strip()
+    return manifest
+
+
+def load_checkpoint(path):
+    # Files recorded as done or skipped are not parsed again; failures are retried
+    finished = set()
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by an interrupted run
+                if entry.get("status") in ("done", "skipped"):
+                    finished.add(entry["path"])
+    return finished
+
+
+def parse_statement_file(path, password, engine=None):
+    # Runs in a pool process: hash and parse one statement, without touching the database
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+            size += len(chunk)
+
+    statement = open_statement(path, password)
+    try:
+        return {
+            "sha256": digest.hexdigest(),
+            "size": size,
+            "metadata": parse_metadata(statement),
+            "total_summary": parse_summary_table(statement),
+            # This process is already one of the pool's workers
+            "transactions": list(iter_transactions(statement, parallel=False, engine=engine))
+        }
+    finally:
+        statement.close()
+
+
+class IngestWriter:
+    """The single database writer of a bulk ingestion run.
+
+    Parsed statements are stored in savepoints and committed every
+    `commit_every` files; a file is only checkpointed once its commit has
+    succeeded, so an interrupted run resumes without losing or repeating work.
+    """
+
+    def __init__(self, checkpoint_path, commit_every):
+        self.store = get_blob_store()
+        self.checkpoint = open(checkpoint_path, 'a')
+        self.commit_every = commit_every
+        self.pending = []
+        self.stored = 0
+        self.skipped = 0
+        self.failed = 0
+        self.transactions = 0
+
+    def _record(self, entry):
+        self.checkpoint.write(json.dumps(entry) + "\n")
+
+    def fail(self, rel_path, error):
+        click.echo(f"ERROR ingesting {rel_path}: {error}", err=True)
+        self.failed += 1
+        self._record({"path": rel_path, "status": "failed", "error": str(error)})
+        self.checkpoint.flush()
+
+    def write(self, rel_path, path, parsed):
+        existing = db.session.query(PdfDocument.id).filter_by(content_hash=parsed["sha256"]).scalar()
+        if existing is not None:
+            self.pending.append({"path": rel_path, "status": "skipped", "pdf_id": existing, "transactions": 0})
+            return
+
+        published = False
+        try:
+            with db.session.begin_nested():
+                doc = PdfDocument(
+                    filename=secure_filename(os.path.basename(path)),
+                    blob_key=parsed["sha256"],
+                    size=parsed["size"],
+                    content_hash=parsed["sha256"],
+                    uploaded_at=datetime.utcnow()
+                )
+                db.session.add(doc)
+                db.session.flush()
+                result = store_statement(doc.id, parsed["metadata"], parsed["total_summary"], parsed["transactions"])
+                # Only a statement that stored cleanly is copied into the blob store
+                self.store.put_file(parsed["sha256"], path)
+                published = True
+        except Exception as e:
+            if published:
+                discard_unreferenced_blob(self.store, parsed["sha256"])
+            self.fail(rel_path, e)
+            return
+
+        self.pending.append({
+            "path": rel_path,
+            "status": "done",
+            "pdf_id": doc.id,
+            "blob_key": parsed["sha256"],
+            "transactions": result["transaction_count"]
+        })
+        if len(self.pending) >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for entry in self.pending:
+                if entry["status"] == "done":
+                    discard_unreferenced_blob(self.store, entry["blob_key"])
+                self.fail(entry["path"], e)
+            self.pending = []
+            return
+
+        for entry in self.pending:
+            self._record(entry)
+            if entry["status"] == "done":
+                self.stored += 1
+                self.transactions += entry["transactions"]
+            else:
+                self.skipped += 1
+        self.pending = []
+        self.checkpoint.flush()
+        os.fsync(self.checkpoint.fileno())
+
+    def close(self):
+        self.checkpoint.close()
+
+
+@click.command("ingest")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option("--passwords", "manifest_path", type=click.Path(exists=True, dir_okay=False),
+              help="JSON object or two-column CSV mapping statement paths (or file names) to passwords.")
+@click.option("--password", "default_password", default=None, help="Password for statements not in the manifest.")
+@click.option("--workers", type=int, default=None, help="Parser processes (default: one per CPU).")
+@click.option("--commit-every", type=int, default=20, show_default=True, help="Statements per database commit.")
+@click.option("--checkpoint", "checkpoint_path", type=click.Path(dir_okay=False), default=None,
+              help=f"Progress file used to resume (default: DIRECTORY/{CHECKPOINT_NAME}).")
+@with_appcontext
+def ingest_command(directory, manifest_path, default_password, workers, commit_every, checkpoint_path):
+    """Ingest every PDF statement under DIRECTORY.
+
+    Statements are parsed on a process pool and written by this process
+    alone. Rerunning the command resumes where an interrupted run stopped.
+    """
+    manifest = load_password_manifest(manifest_path) if manifest_path else {}
+    checkpoint_path = checkpoint_path or os.path.join(directory, CHECKPOINT_NAME)
+    finished = load_checkpoint(checkpoint_path)
+    todo = [(rel, path) for rel, path in find_statements(directory) if rel not in finished]
+    workers = min(workers or os.cpu_count() or 1, max(1, len(todo)))
+
+    click.echo(f"{len(todo)} statements to ingest ({len(finished)} already done) with {workers} parser processes")
+    if not todo:
+        return
+
+    def password_for(rel):
+        return manifest.get(rel, manifest.get(os.path.basename(rel), default_password))
+
+    # Pool processes have no app context, so they are handed the configured engine
+    engine = current_app.config['TRANSACTION_ENGINE']
+    writer = IngestWriter(checkpoint_path, max(1, commit_every))
+    started = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=parse_pool_context())
+    queued = iter(todo)
+    in_flight = {}
+
+    def submit_next():
+        item = next(queued, None)
+        if item is not None:
+            rel, path = item
+            in_flight[pool.submit(parse_statement_file, path, password_for(rel), engine)] = item
+
+    try:
+        # Keep a couple of files per worker in flight so parsers never wait on the writer
+        for _ in range(workers * 2):
+            submit_next()
+
+        while in_flight:
+            completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                rel, path = in_flight.pop(future)
+                submit_next()
+                try:
+                    parsed = future.result()
+                except Exception as e:
+                    writer.fail(rel, e)
+                    continue
+                writer.write(rel, path, parsed)
+
+            done = writer.stored + len(writer.pending) + writer.skipped + writer.failed
+            if done % 100 == 0 or not in_flight:
+                click.echo(f"  {done}/{len(todo)} statements")
+
+        writer.commit()
+
+    except KeyboardInterrupt:
+        db.session.rollback()
+        # The blobs of the rolled back documents would be left orphaned
+        for entry in writer.pending:
+            if entry["status"] == "done":
+                discard_unreferenced_blob(writer.store, entry["blob_key"])
+        # shutdown(cancel_futures=True) needs Python 3.9
+        for future in in_flight:
+            future.cancel()
+        pool.shutdown(wait=False)
+        click.echo("Interrupted; run the command again to resume", err=True)
+        raise
+
+    finally:
+        pool.shutdown(wait=True)
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    click.echo(
+        f"Ingested {writer.stored} statements ({writer.skipped} already stored, {writer.failed} failed), "
+        f"{writer.transactions} transactions in {elapsed:.1f}s"
+    )
+    click.echo(f"  {writer.stored / elapsed:.2f} files/s, {writer.transactions / elapsed:.0f} transactions/s")
@@ -0,0 +1,43 @@
+from models import db, InternedString
+from parser.bulk import bulk_insert_ignore
+from parser.normalize import normalize_details
+
+COUNTERPARTY = "counterparty"
+CATEGORY = "category"
+
+
+class StringInterner:
+    """Resolve names to interned_string ids, inserting the ones not seen before.
+
+    Ids are remembered for the lifetime of the interner, so a statement only
+    looks up each distinct name once. Use one interner per transaction: ids
+    of rows inserted by a rolled-back transaction must not be reused.
+    """
+
+    def __init__(self):
+        self._ids = {}
+
+    def intern(self, kind, values):
+        missing = {value for value in values if (kind, value) not in self._ids}
+        if missing:
+            bulk_insert_ignore(InternedString, [{"kind": kind, "value": value} for value in missing], ["kind", "value"])
+            rows = db.session.query(InternedString.id, InternedString.value) \
+                .filter(InternedString.kind == kind, InternedString.value.in_(missing)).all()
+            for string_id, value in rows:
+                self._ids[(kind, value)] = string_id
+        return {value: self._ids[(kind, value)] for value in values}
+
+    def id_for(self, kind, value):
+        return self._ids[(kind, value)]
+
+    def annotate(self, transactions):
+        """Normalize each transaction's details and attach the counterparty/category names and ids."""
+        for txn in transactions:
+            txn['counterparty'], txn['category'] = normalize_details(txn['details'])
+
+        counterparty_ids = self.intern(COUNTERPARTY, {txn['counterparty'] for txn in transactions})
+        category_ids = self.intern(CATEGORY, {txn['category'] for txn in transactions})
+        for txn in transactions:
+            txn['counterparty_id'] = counterparty_ids[txn['counterparty']]
+            txn['category_id'] = category_ids[txn['category']]
+        return transactions
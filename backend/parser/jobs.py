@@ -0,0 +1,245 @@
+from flask import Blueprint, jsonify, current_app
+from models import db, PdfDocument, IngestionJob
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import SQLAlchemyError
+import logging
+import threading
+import time
+from parser.document import open_stored_statement
+from parser.storage import get_blob_store
+from parser.pipeline import ingest_statement, clear_document_analysis
+from parser.cache import invalidate_document
+from parser.metrics import collect_stage_timings, log_timings, stage
+
+jobs_bp = Blueprint("jobs_bp", __name__)
+logger = logging.getLogger(__name__)
+
+# Stage/progress of jobs running in this process, keyed by job id. Only used on
+# SQLite, where the job row cannot be written while the ingest transaction is open.
+_live_progress = {}
+_progress_lock = threading.Lock()
+
+# Decryption passwords of queued jobs, keyed by job id. They are never written to the database:
+# a job that needs one is only claimed by the process holding it, and fails if that process is gone.
+_passwords = {}
+_passwords_lock = threading.Lock()
+PASSWORD_LOST = "Statement password is no longer available (the server restarted); please re-upload"
+
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def enqueue_ingestion(pdf_id, password=None):
+    job = IngestionJob(pdf_id=pdf_id, needs_password=password is not None, status='queued', stage='queued')
+    db.session.add(job)
+    if password is not None:
+        db.session.flush()
+        with _passwords_lock:
+            _passwords[job.id] = password
+    return job
+
+
+def notify_workers():
+    _wakeup.set()
+
+
+def start_ingestion_workers(app):
+    count = app.config.get('INGEST_WORKERS', 0)
+    with _workers_lock:
+        if _workers or count <= 0:
+            return
+        for n in range(count):
+            worker = threading.Thread(
+                target=_worker_loop,
+                args=(app,),
+                name=f"ingest-worker-{n}",
+                daemon=True
+            )
+            worker.start()
+            _workers.append(worker)
+
+
+@jobs_bp.before_app_request
+def _ensure_workers():
+    if not _workers:
+        start_ingestion_workers(current_app._get_current_object())
+
+
+def _set_progress(job_id, stage, percent):
+    # Committed on a connection of its own, so /jobs/<id> in any process sees it mid-ingest
+    if db.engine.dialect.name == 'sqlite':
+        with _progress_lock:
+            _live_progress[job_id] = {"stage": stage, "progress": percent}
+        return
+    jobs = IngestionJob.__table__
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(
+                jobs.update()
+                .where(jobs.c.id == job_id, jobs.c.status == 'running')
+                .values(stage=stage, progress=percent)
+            )
+    except SQLAlchemyError:
+        logger.warning("Recording the progress of ingestion job %s failed", job_id, exc_info=True)
+
+
+def _fail_lost_password_jobs(cutoff):
+    # Jobs whose password was held by a process that died (or restarted) can never run. A queued
+    # job that no process claimed within INGEST_JOB_TIMEOUT is assumed to be one of them.
+    lost = IngestionJob.query.filter(
+        IngestionJob.needs_password.is_(True),
+        or_(
+            and_(IngestionJob.status == 'running', IngestionJob.started_at < cutoff),
+            and_(IngestionJob.status == 'queued', IngestionJob.created_at < cutoff)
+        )
+    )
+    with _passwords_lock:
+        if _passwords:
+            lost = lost.filter(IngestionJob.id.notin_(list(_passwords)))
+    lost.update({
+        "status": "failed",
+        "stage": "failed",
+        "error": PASSWORD_LOST,
+        "finished_at": datetime.utcnow()
+    }, synchronize_session=False)
+
+
+def _claim_next_job(stale_after):
+    """Claim the oldest queued job this process can run; returns (job id, password) or (None, None)."""
+    cutoff = datetime.utcnow() - stale_after
+    _fail_lost_password_jobs(cutoff)
+    # Requeue jobs whose worker died mid-run
+    IngestionJob.query.filter(
+        IngestionJob.status == 'running',
+        IngestionJob.started_at < cutoff
+    ).update({"status": "queued", "stage": "queued"}, synchronize_session=False)
+    db.session.commit()
+
+    with _passwords_lock:
+        local = list(_passwords)
+    runnable = IngestionJob.needs_password.is_(False)
+    if local:
+        runnable = or_(runnable, IngestionJob.id.in_(local))
+    candidates = db.session.query(IngestionJob.id).filter(IngestionJob.status == 'queued', runnable) \
+        .order_by(IngestionJob.id).limit(5).all()
+
+    # Conditional update so two workers (or processes) never claim the same job
+    for (job_id,) in candidates:
+        claimed = IngestionJob.query.filter_by(id=job_id, status='queued').update(
+            {"status": "running", "stage": "starting", "started_at": datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.session.commit()
+        if claimed:
+            # The password is only needed to open the statement; drop it as soon as the job is ours
+            with _passwords_lock:
+                return job_id, _passwords.pop(job_id, None)
+    return None, None
+
+
+def _run_job(job_id, password=None):
+    with collect_stage_timings() as timings:
+        started = time.perf_counter()
+        status = _ingest_job(job_id, password)
+        log_timings(
+            "ingestion_job",
+            timings,
+            job_id=job_id,
+            status=status,
+            duration_ms=round((time.perf_counter() - started) * 1000, 2)
+        )
+
+
+def _ingest_job(job_id, password=None):
+    job = db.session.get(IngestionJob, job_id)
+    doc = db.session.get(PdfDocument, job.pdf_id)
+    _set_progress(job_id, "starting", 0)
+
+    try:
+        with stage("open"):
+            statement = open_stored_statement(get_blob_store(), doc.blob_key, password)
+        try:
+            # An earlier attempt or job may have stored rows for the document; replace them
+            clear_document_analysis(doc.id)
+            ingest_statement(doc.id, statement, progress=lambda name, pct: _set_progress(job_id, name, pct))
+        finally:
+            statement.close()
+
+        job.status = 'done'
+        job.stage = 'done'
+        job.progress = 100
+        job.finished_at = datetime.utcnow()
+        with stage("commit"):
+            db.session.commit()
+        invalidate_document(doc.id)
+
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Ingestion job %s failed", job_id)
+        job = db.session.get(IngestionJob, job_id)
+        job.status = 'failed'
+        job.stage = 'failed'
+        job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    finally:
+        with _progress_lock:
+            _live_progress.pop(job_id, None)
+
+    return job.status
+
+
+def _worker_loop(app):
+    poll_interval = app.config.get('INGEST_POLL_INTERVAL', 2.0)
+    stale_after = timedelta(seconds=app.config.get('INGEST_JOB_TIMEOUT', 1800))
+
+    while True:
+        job_id = None
+        with app.app_context():
+            try:
+                job_id, password = _claim_next_job(stale_after)
+                if job_id is not None:
+                    _run_job(job_id, password)
+            except Exception:
+                db.session.rollback()
+                logger.exception("Ingestion worker error")
+            finally:
+                db.session.remove()
+
+        if job_id is None:
+            _wakeup.wait(poll_interval)
+            _wakeup.clear()
+
+
+def serialize_job(job):
+    data = {
+        "id": job.id,
+        "pdf_id": job.pdf_id,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+    with _progress_lock:
+        live = _live_progress.get(job.id)
+    if live and job.status == 'running':
+        data.update(live)
+
+    return data
+
+
+@jobs_bp.route("/jobs/<int:job_id>", methods=["GET"])
+def get_job(job_id):
+    job = db.session.get(IngestionJob, job_id)
+
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify(serialize_job(job)), 200
@@ -0,0 +1,105 @@
+import numpy as np
+
+# Words that start each column title of the detailed statement, and the record field of that column
+COLUMN_TITLE_STARTS = {
+    "Receipt": "receipt_no",
+    "Completion": "completion_time",
+    "Details": "details",
+    "Transaction": "transaction_status",
+    "Paid": "paid_in",
+    "Withdrawn": "withdrawn",
+    "Withdraw": "withdrawn",
+    "Balance": "balance",
+}
+COLUMNS = ("receipt_no", "completion_time", "details", "transaction_status", "paid_in", "withdrawn", "balance")
+HEADER_SEARCH_PAGES = 3  # The detailed statement starts on one of the first pages
+COLUMN_MARGIN = 2.0  # Points a cell's text may start left of its column title
+
+
+class TableLayout:
+    """The x-boundaries between the columns of a statement's transaction table.
+
+    Cells are left-aligned under their titles, so a word belongs to the last
+    column starting at or before its left edge; `boundaries[i]` is where
+    COLUMNS[i + 1] starts. Long details may run across the gap towards the
+    status column, which is why the boundaries are not gap midpoints.
+    """
+
+    def __init__(self, boundaries):
+        self.boundaries = np.asarray(boundaries, dtype=float)
+
+    def __repr__(self):
+        return f"TableLayout({[round(b, 1) for b in self.boundaries]})"
+
+
+def _row_ids(words):
+    # Words whose vertical centres are within half a line height of the previous one share a row
+    y0 = np.array([w[1] for w in words], dtype=float)
+    y1 = np.array([w[3] for w in words], dtype=float)
+    middle = (y0 + y1) / 2
+    order = np.argsort(middle, kind="stable")
+    tolerance = float(np.median(y1 - y0)) / 2
+    rows = np.empty(len(words), dtype=np.int64)
+    rows[order] = np.concatenate(([0], np.cumsum(np.diff(middle[order]) > tolerance)))
+    return rows
+
+
+def learn_table_layout(words):
+    """Find the column titles among a page's words and derive the column boundaries, or None."""
+    if not words:
+        return None
+    rows = _row_ids(words)
+    for row in np.unique(rows):
+        titles = sorted((words[i] for i in np.flatnonzero(rows == row)), key=lambda w: w[0])
+        starts = []  # (field, x0) of each column title; further words of a title are skipped
+        for x0, _, _, _, text, *_ in titles:
+            field = COLUMN_TITLE_STARTS.get(text)
+            if field is not None and field not in (start[0] for start in starts):
+                starts.append((field, x0))
+        if [field for field, _ in starts] != list(COLUMNS):
+            continue
+        return TableLayout([x0 - COLUMN_MARGIN for _, x0 in starts[1:]])
+    return None
+
+
+def find_table_layout(statement):
+    """Learn the transaction table layout from the first page that has the column titles."""
+    for index in range(min(HEADER_SEARCH_PAGES, statement.page_count)):
+        layout = learn_table_layout(statement.page_words(index))
+        if layout is not None:
+            return layout
+    return None
+
+
+def page_rows(words, layout):
+    """Assemble a page's words into table rows, top to bottom.
+
+    Returns (top, bottom, cells) per row, with one text per column in
+    `cells`. Rows and columns are assigned to every word of the page at once;
+    only the joining of each cell's words is done per cell.
+    """
+    if not words:
+        return []
+    x0 = np.array([w[0] for w in words], dtype=float)
+    y0 = np.array([w[1] for w in words], dtype=float)
+    y1 = np.array([w[3] for w in words], dtype=float)
+    columns = np.searchsorted(layout.boundaries, x0, side="right")
+    rows = _row_ids(words)
+
+    # Reading order: by row, then column, then left to right within the cell
+    order = np.lexsort((x0, columns, rows))
+    cell_keys = rows[order] * len(COLUMNS) + columns[order]
+    cell_starts = np.flatnonzero(np.concatenate(([True], np.diff(cell_keys) != 0)))
+    row_starts = np.flatnonzero(np.concatenate(([True], np.diff(rows[order]) != 0)))
+    tops = np.minimum.reduceat(y0[order], row_starts)
+    bottoms = np.maximum.reduceat(y1[order], row_starts)
+
+    texts = [words[i][4] for i in order]
+    cell_ends = np.append(cell_starts[1:], len(order))
+    row_of_cell = np.searchsorted(row_starts, cell_starts, side="right") - 1
+    column_of_cell = columns[order][cell_starts]
+
+    result = [(float(top), float(bottom), [""] * len(COLUMNS)) for top, bottom in zip(tops, bottoms)]
+    for start, end, row, column in zip(cell_starts, cell_ends, row_of_cell, column_of_cell):
+        result[row][2][column] = " ".join(texts[start:end])
+    return result
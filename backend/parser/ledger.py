@@ -0,0 +1,181 @@
+from flask import Blueprint, request, jsonify
+from models import db, Customer, LedgerEntry
+from datetime import datetime, timedelta
+from sqlalchemy import func, tuple_
+import re
+from parser.bulk import bulk_insert_ignore
+from parser.serialize import json_amount, json_time
+from parser.pagination import page_limit, decode_cursor, fetch_page, paginated_response, InvalidPageRequest
+
+ledger_bp = Blueprint("ledger_bp", __name__)
+
+
+def normalize_mobile_number(value):
+    # "+254 712 345 678", "254712345678" and "0712345678" are the same customer
+    if not value or "*" in value:
+        return None  # masked or missing
+    digits = re.sub(r"\D", "", value)
+    if digits.startswith("254") and len(digits) == 12:
+        digits = "0" + digits[3:]
+    return digits if len(digits) >= 9 else None
+
+
+def resolve_customer(mobile_number, customer_name=None):
+    """Return the id of the customer with this mobile number, creating it if needed."""
+    mobile = normalize_mobile_number(mobile_number)
+    if mobile is None:
+        return None
+
+    bulk_insert_ignore(Customer, [{
+        "mobile_number": mobile,
+        "customer_name": customer_name,
+        "created_at": datetime.utcnow()
+    }], ["mobile_number"])
+    return db.session.query(Customer.id).filter_by(mobile_number=mobile).scalar()
+
+
+class LedgerSequence:
+    """Numbers consecutive rows that share a receipt number.
+
+    A payment and its charge are printed as adjacent rows with the same
+    receipt number; the sequence keeps both while still matching the same
+    rows when they reappear in an overlapping statement.
+    """
+
+    def __init__(self):
+        self.receipt_no = None
+        self.seq = 0
+
+    def next(self, receipt_no):
+        if receipt_no == self.receipt_no:
+            self.seq += 1
+        else:
+            self.receipt_no = receipt_no
+            self.seq = 0
+        return self.seq
+
+
+def save_ledger_entries(customer_id, pdf_id, transactions, sequence):
+    """Merge transactions into the customer's ledger; returns the ones that were new."""
+    rows = [
+        {
+            "customer_id": customer_id,
+            "pdf_id": pdf_id,
+            "receipt_no": txn['receipt_no'],
+            "entry_seq": sequence.next(txn['receipt_no']),
+            "completion_time": txn['completion_time'],
+            "details": txn['details'],
+            "transaction_status": txn['transaction_status'],
+            "paid_in": txn['paid_in'],
+            "withdraw": txn['withdrawn'],
+            "balance": txn['balance']
+        }
+        for txn in transactions
+    ]
+    inserted = set(bulk_insert_ignore(LedgerEntry, rows, ["customer_id", "receipt_no", "entry_seq"]))
+    return [
+        txn for txn, row in zip(transactions, rows)
+        if (customer_id, row["receipt_no"], row["entry_seq"]) in inserted
+    ]
+
+
+def _serialize_customer(customer):
+    return {
+        "id": customer.id,
+        "mobile_number": customer.mobile_number,
+        "customer_name": customer.customer_name
+    }
+
+
+@ledger_bp.route("/customers", methods=["GET"])
+def list_customers():
+    try:
+        limit = page_limit(request.args)
+        cursor = decode_cursor(request.args.get('cursor'), (int,))
+        after_id = cursor[0] if cursor else None
+    except (InvalidPageRequest, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    query = Customer.query
+    if request.args.get('mobile'):
+        mobile = normalize_mobile_number(request.args['mobile'])
+        if mobile is None:
+            return jsonify({"error": "Invalid mobile number"}), 400
+        query = query.filter(Customer.mobile_number == mobile)
+    if after_id is not None:
+        query = query.filter(Customer.id > after_id)
+
+    customers, next_cursor = fetch_page(query.order_by(Customer.id), limit, lambda c: [c.id])
+    return paginated_response([_serialize_customer(c) for c in customers], next_cursor)
+
+
+@ledger_bp.route("/customers/<int:customer_id>/ledger", methods=["GET"])
+def customer_ledger(customer_id):
+    if not db.session.get(Customer, customer_id):
+        return jsonify({"error": "Customer not found"}), 404
+
+    args = request.args
+    try:
+        limit = page_limit(args)
+        cursor = decode_cursor(args.get('cursor'), (datetime.fromisoformat, int))
+        after = tuple(cursor) if cursor else None
+        start = datetime.fromisoformat(args['from']) if args.get('from') else None
+        end = datetime.fromisoformat(args['to']) if args.get('to') else None
+    except (InvalidPageRequest, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Keyset pagination on (completion_time, id), oldest first
+    query = LedgerEntry.query.filter(LedgerEntry.customer_id == customer_id)
+    if start:
+        query = query.filter(LedgerEntry.completion_time >= start)
+    if end:
+        # A bare date includes the whole day
+        if len(args['to']) == 10:
+            query = query.filter(LedgerEntry.completion_time < end + timedelta(days=1))
+        else:
+            query = query.filter(LedgerEntry.completion_time <= end)
+    if after:
+        query = query.filter(tuple_(LedgerEntry.completion_time, LedgerEntry.id) > after)
+    query = query.order_by(LedgerEntry.completion_time, LedgerEntry.id)
+
+    entries, next_cursor = fetch_page(query, limit, lambda e: [e.completion_time.isoformat(), e.id])
+
+    return paginated_response([
+        {
+            "id": entry.id,
+            "pdf_id": entry.pdf_id,
+            "receipt_no": entry.receipt_no,
+            "completion_time": json_time(entry.completion_time),
+            "details": entry.details,
+            "transaction_status": entry.transaction_status,
+            "paid_in": json_amount(entry.paid_in),
+            "withdrawn": json_amount(entry.withdraw),
+            "balance": json_amount(entry.balance)
+        }
+        for entry in entries
+    ], next_cursor)
+
+
+@ledger_bp.route("/customers/<int:customer_id>/summary", methods=["GET"])
+def customer_summary(customer_id):
+    customer = db.session.get(Customer, customer_id)
+    if not customer:
+        return jsonify({"error": "Customer not found"}), 404
+
+    totals = db.session.query(
+        func.count(LedgerEntry.id),
+        func.sum(LedgerEntry.paid_in),
+        func.sum(LedgerEntry.withdraw),
+        func.min(LedgerEntry.completion_time),
+        func.max(LedgerEntry.completion_time)
+    ).filter(LedgerEntry.customer_id == customer_id).one()
+
+    count, paid_in, withdrawn, first, last = totals
+    return jsonify({
+        **_serialize_customer(customer),
+        "transaction_count": count,
+        "total_paid_in": json_amount(paid_in) or 0.0,
+        "total_withdrawn": json_amount(withdrawn) or 0.0,
+        "first_transaction": json_time(first),
+        "last_transaction": json_time(last)
+    }), 200
@@ -0,0 +1,45 @@
+import json
+import logging
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed as extra={"fields": {...}} become top-level keys."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The usual text line, followed by the record's fields as key=value pairs."""
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            pairs = " ".join(f"{key}={json.dumps(value, default=str)}" for key, value in fields.items())
+            line, _, rest = line.partition("\n")
+            line = f"{line} {pairs}" + (f"\n{rest}" if rest else "")
+        return line
+
+
+def configure_logging(app):
+    """Send the `parser` loggers to stderr in the configured format (LOG_FORMAT=text or json)."""
+    handler = logging.StreamHandler()
+    if app.config.get('LOG_FORMAT', 'text') == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    logger = logging.getLogger("parser")
+    logger.handlers[:] = [handler]
+    logger.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    logger.propagate = False
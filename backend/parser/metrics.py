@@ -0,0 +1,305 @@
+from flask import Blueprint, Response, current_app, g, has_request_context, request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from sqlalchemy import event
+import logging
+import math
+import threading
+import time
+
+metrics_bp = Blueprint("metrics_bp", __name__)
+timing_logger = logging.getLogger("parser.timing")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; ingestion stages range from sub-millisecond inserts to minute-long parses
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Registry:
+    """The metrics of this process, rendered in the Prometheus text format.
+
+    Each process keeps its own values: with several gunicorn workers every
+    worker answers /metrics for itself.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames) or any(name not in labels for name in self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, *extra):
+        return list(zip(self.labelnames, key)) + list(extra)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, self._labels(key), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        for key, (counts, total, count) in values:
+            # Buckets are stored per interval and exposed cumulatively
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", self._labels(key, ("le", _format_value(float(bound)))), cumulative
+            yield f"{self.name}_bucket", self._labels(key, ("le", "+Inf")), count
+            yield f"{self.name}_sum", self._labels(key), total
+            yield f"{self.name}_count", self._labels(key), count
+
+
+STAGE_DURATION = Histogram(
+    "mpesa_ingest_stage_duration_seconds",
+    "Time spent in each stage of statement ingestion.",
+    ["stage"]
+)
+UPLOAD_DURATION = Histogram(
+    "mpesa_upload_duration_seconds",
+    "Time to handle an upload request, excluding streaming the response body.",
+    ["route", "status"]
+)
+UPLOADS = Counter("mpesa_uploads_total", "Upload requests by route and response status.", ["route", "status"])
+UPLOAD_BYTES = Counter("mpesa_upload_bytes_total", "Bytes of statement PDFs received.")
+PAGES = Counter("mpesa_pages_processed_total", "Statement pages parsed.")
+TRANSACTIONS = Counter("mpesa_transactions_ingested_total", "Transaction rows parsed and staged for commit.")
+HTTP_REQUESTS = Counter("mpesa_http_requests_total", "HTTP requests by method, route and status.", ["method", "route", "status"])
+HTTP_DURATION = Histogram(
+    "mpesa_http_request_duration_seconds",
+    "Time to produce an HTTP response, excluding streamed bodies.",
+    ["method", "route"]
+)
+DB_QUERIES = Counter("mpesa_db_queries_total", "SQL statements executed.")
+DB_QUERIES_PER_REQUEST = Histogram(
+    "mpesa_db_queries_per_request",
+    "SQL statements executed while handling one HTTP request.",
+    ["method", "route"],
+    buckets=QUERY_COUNT_BUCKETS
+)
+
+
+class StageTimings:
+    """Stage durations and facts gathered while one statement is ingested, for its log line."""
+
+    def __init__(self):
+        self.stages = {}
+        self.fields = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def as_log_fields(self):
+        return {**self.fields, "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()}}
+
+
+_current_timings = ContextVar("stage_timings", default=None)
+
+
+@contextmanager
+def collect_stage_timings():
+    timings = StageTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+def note(**fields):
+    """Attach facts (document id, page count...) to the timings being collected, if any."""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.fields.update(fields)
+
+
+def record_stage(stage, seconds):
+    STAGE_DURATION.observe(seconds, stage=stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def timed_iter(iterable, name):
+    # Times only the work done inside the iterator, not what the consumer does between items
+    iterator = iter(iterable)
+    spent = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                spent += time.perf_counter() - started
+                return
+            spent += time.perf_counter() - started
+            yield item
+    finally:
+        record_stage(name, spent)
+
+
+def log_timings(event_name, timings, **fields):
+    """Emit one structured log line with the stage durations of an ingestion."""
+    timing_logger.info(event_name, extra={"fields": {"event": event_name, **fields, **timings.as_log_fields()}})
+
+
+def instrument_upload(route):
+    """Time an upload view: its stages, its total duration and its response status."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            with collect_stage_timings() as timings:
+                response = current_app.make_response(view(*args, **kwargs))
+            elapsed = time.perf_counter() - started
+            UPLOAD_DURATION.observe(elapsed, route=route, status=response.status_code)
+            UPLOADS.inc(route=route, status=response.status_code)
+            log_timings(
+                "upload",
+                timings,
+                route=route,
+                status=response.status_code,
+                duration_ms=round(elapsed * 1000, 2),
+                db_queries=request_query_count()
+            )
+            return response
+        return wrapper
+    return decorator
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def _count_query(*args):
+    DB_QUERIES.inc()
+    if has_request_context():
+        g.db_queries = g.get("db_queries", 0) + 1
+
+
+def request_query_count():
+    return g.get("db_queries", 0) if has_request_context() else 0
+
+
+def init_metrics(app, db):
+    """Count SQL statements and time every request of `app`."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", _count_query)
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop("request_started", None)
+        if started is not None and request.endpoint != "metrics_bp.metrics":
+            route = _route()
+            HTTP_DURATION.observe(time.perf_counter() - started, method=request.method, route=route)
+            HTTP_REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+            DB_QUERIES_PER_REQUEST.observe(request_query_count(), method=request.method, route=route)
+        return response
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    if not current_app.config.get('METRICS_ENABLED', True):
+        return Response("metrics are disabled\n", status=404, mimetype="text/plain")
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,144 @@
+import re
+from collections import namedtuple
+
+Normalized = namedtuple("Normalized", ["counterparty", "category"])
+
+# Transaction types, tried in order. Patterns see the details text with its
+# whitespace collapsed; {party} captures the counterparty and {code} a till,
+# paybill or agent number.
+DEFAULT_RULES = [
+    ("Charges", r".*\bCharge"),
+    ("Pay Bill", r"Pay Bill(?: Online)? (?:to|from) {code} - {party}?(?: Acc\. ?\S*)?"),
+    ("Buy Goods", r"(?:Merchant Payment|Buy Goods)(?: Online)? to {code} - {party}"),
+    ("Withdrawal", r"Customer Withdrawal At Agent Till {code} - {party}"),
+    ("Deposit", r"Deposit of Funds at Agent Till {code} - {party}"),
+    ("Business Payment", r"(?:Business|Promotion) Payment from {code} - {party}?(?: via API.*)?"),
+    ("Send Money", r"Customer (?:Transfer|Send Money)(?: to| Fuliza M-Pesa to)? {party}"),
+    ("Received Money", r"Funds received from {party}"),
+    ("Airtime", r"(?:Airtime|Bundle) Purchase(?: for| to)?{party}?"),
+    ("Fuliza", r"(?:OD Loan Repayment|OverDraft of Credit Party|Overdraft).*"),
+    ("M-Shwari", r"M-Shwari.*"),
+]
+
+# Canonical merchants and the names or paybill/till numbers they appear under.
+# Names match on a word prefix: "NAIVAS" also covers "NAIVAS SUPERMARKET KILIMANI".
+DEFAULT_MERCHANTS = {
+    "KPLC": ["KPLC", "KPLC PREPAID", "KPLC POSTPAID", "KENYA POWER", "888880", "888888"],
+    "SAFARICOM": ["SAFARICOM", "SAFARICOM DATA BUNDLES", "SAFARICOM OFFERS", "SAFARICOM POSTPAID"],
+    "EQUITY BANK": ["EQUITY BANK", "EQUITY PAYBILL ACCOUNT", "247247"],
+    "KCB": ["KCB", "KCB PAYBILL AC", "KENYA COMMERCIAL BANK", "522522"],
+    "NAIVAS": ["NAIVAS"],
+    "CARREFOUR": ["CARREFOUR", "MAJID AL FUTTAIM"],
+    "QUICKMART": ["QUICKMART", "QUICK MART"],
+    "ZUKU": ["ZUKU", "WANANCHI GROUP"],
+}
+
+OTHER = "Other"
+
+_PHONE_PREFIX_RE = re.compile(r"^(?:\+?254|0)?[\d*]{6,}\s*-\s*")  # "0712***101 - " before a name
+_NOISE_RE = re.compile(r"[^A-Z0-9&' -]+")
+
+
+class MerchantTrie:
+    """Word-level prefix trie mapping merchant names to canonical names."""
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, name, canonical):
+        node = self.root
+        for token in name.upper().split():
+            node = node.setdefault(token, {})
+        node[None] = canonical
+
+    def match(self, tokens):
+        # Longest registered prefix of `tokens`
+        node = self.root
+        found = None
+        for token in tokens:
+            node = node.get(token)
+            if node is None:
+                break
+            found = node.get(None, found)
+        return found
+
+
+class Normalizer:
+    """Map raw transaction details to a canonical counterparty and category.
+
+    All rules are compiled into one alternation, so each details string is
+    scanned once; results are memoized because the same details repeat
+    throughout a statement.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES, merchants=DEFAULT_MERCHANTS, cache_size=50000):
+        self.categories = [category for category, _ in rules]
+        self.groups = []
+        alternatives = []
+        for i, (_, pattern) in enumerate(rules):
+            self.groups.append((
+                f"r{i}_party" if "{party}" in pattern else None,
+                f"r{i}_code" if "{code}" in pattern else None
+            ))
+            pattern = pattern.replace("{party}", rf"(?P<r{i}_party>.+?)").replace("{code}", rf"(?P<r{i}_code>\d+)")
+            alternatives.append(rf"(?P<r{i}>{pattern})")
+        self.pattern = re.compile(r"(?:" + "|".join(alternatives) + r")\Z", re.IGNORECASE)
+
+        self.trie = MerchantTrie()
+        for canonical, names in merchants.items():
+            for name in names:
+                self.trie.insert(name, canonical)
+
+        self.cache_size = cache_size
+        self._cache = {}
+
+    def register_merchant(self, canonical, *names):
+        for name in names:
+            self.trie.insert(name, canonical)
+        self._cache.clear()
+
+    def _counterparty(self, party, code):
+        # A known till/paybill number wins over whatever name is printed next to it
+        if code:
+            canonical = self.trie.match([code])
+            if canonical:
+                return canonical
+        if not party:
+            return None
+        party = _NOISE_RE.sub(" ", _PHONE_PREFIX_RE.sub("", party.strip()).upper())
+        tokens = party.split()
+        if not tokens:
+            return None
+        return self.trie.match(tokens) or " ".join(tokens)
+
+    def normalize(self, details):
+        result = self._cache.get(details)
+        if result is not None:
+            return result
+
+        text = " ".join(details.split())
+        match = self.pattern.match(text)
+        if match:
+            index = int(match.lastgroup[1:])
+            category = self.categories[index]
+            party_group, code_group = self.groups[index]
+            counterparty = self._counterparty(
+                match.group(party_group) if party_group else None,
+                match.group(code_group) if code_group else None
+            ) or category.upper()
+        else:
+            category = OTHER
+            counterparty = self._counterparty(text, None) or OTHER.upper()
+
+        result = Normalized(counterparty[:255], category)
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[details] = result
+        return result
+
+
+default_normalizer = Normalizer()
+
+
+def normalize_details(details):
+    return default_normalizer.normalize(details)
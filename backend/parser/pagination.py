@@ -0,0 +1,67 @@
+from flask import jsonify, request
+from urllib.parse import urlencode
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidPageRequest(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    """Opaque keyset cursor: the sort key of the last row on the page."""
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, types):
+    """Decode a cursor into its sort key; `types` converts each value, e.g. (datetime.fromisoformat, int)."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        # A well-formed cursor may still hold values of the wrong type
+        return [convert(value) for convert, value in zip(types, values)]
+    except (ValueError, TypeError):
+        raise InvalidPageRequest("Invalid cursor")
+
+
+def page_limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise InvalidPageRequest("limit must be an integer")
+    if limit < 1:
+        raise InvalidPageRequest("limit must be positive")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def fetch_page(query, limit, key):
+    """Run a keyset query and split off the cursor for the next page.
+
+    `query` must already be ordered and filtered past the current cursor;
+    one extra row is fetched to tell whether another page exists.
+    """
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(key(rows[-1]))
+    return rows, next_cursor
+
+
+def paginated_response(items, next_cursor):
+    # The body stays a plain list; the next page is advertised in headers
+    response = jsonify(items)
+    if next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    return response
@@ -0,0 +1,222 @@
+from flask import current_app, has_app_context
+from itertools import islice
+from models import (
+    db, PdfDocument, Transaction, SpendingSummary, ReceivedSummary, TotalSummary,
+    CustomerDetails, DocumentExtras, DocumentRollup
+)
+from parser.bulk import save_transactions
+from parser.ledger import resolve_customer, save_ledger_entries, LedgerSequence
+from parser.rollups import update_document_rollups, update_customer_rollups
+from parser.summary import summarize_transactions, save_summaries
+from parser.interning import StringInterner
+from parser.serialize import json_amount, serialize_transaction, serialize_total_summary
+from parser.metrics import stage, timed_iter, note, PAGES, TRANSACTIONS
+from parser.extract import (
+    iter_transactions,
+    parse_metadata,
+    parse_summary_table,
+    save_metadata,
+    save_summary_table
+)
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def _no_progress(stage, percent):
+    pass
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ingest_statement(pdf_id, statement, progress=None, chunk_size=None, parallel_min_pages=None):
+    """Run the full extraction pipeline for one document and stage its rows.
+
+    Transactions stream from the parser in fixed-size chunks: each chunk is
+    normalized to interned counterparty/category ids, written, merged into
+    the customer's ledger and folded into the running summaries and
+    time-bucketed rollups before the next one is parsed, so memory does not
+    grow with the number of transactions.
+
+    Nothing is committed here: every row joins the caller's transaction, so
+    the caller commits the whole document at once or rolls all of it back.
+    `progress(stage, percent)` is called between stages so background jobs
+    can report where they are; `parallel_min_pages` is passed on to
+    iter_transactions. Returns the transaction count and the
+    aggregates that were saved, so callers can answer without reading the
+    summaries back. Every stage is timed (see parser.metrics).
+    """
+    # Metadata first: the customer's mobile number keys their merged ledger
+    report = progress or _no_progress
+    report("metadata", 5)
+    PAGES.inc(statement.page_count)
+    note(pages=statement.page_count)
+    with stage("parse_metadata"):
+        metadata = parse_metadata(statement)
+    with stage("parse_summary_table"):
+        total_summary = parse_summary_table(statement)
+    return store_statement(
+        pdf_id, metadata, total_summary,
+        # Parsing is lazy, so its time is spent inside the chunk loop below
+        timed_iter(iter_transactions(statement, parallel_min_pages), "parse_transactions"),
+        progress=progress, chunk_size=chunk_size
+    )
+
+
+def store_statement(pdf_id, metadata, total_summary, transactions, progress=None, chunk_size=None):
+    """Stage the rows of an already parsed statement (see ingest_statement).
+
+    `transactions` may be any iterable of extractor records, e.g. a parser
+    generator or a list parsed in another process.
+    """
+    report = progress or _no_progress
+    if chunk_size is None:
+        chunk_size = current_app.config.get('INGEST_CHUNK_SIZE', DEFAULT_CHUNK_SIZE) if has_app_context() else DEFAULT_CHUNK_SIZE
+
+    with stage("save_metadata"):
+        details = save_metadata(pdf_id, metadata)
+        save_summary_table(pdf_id, total_summary)
+        customer_id = resolve_customer(details.mobile_number, details.customer_name)
+    sequence = LedgerSequence()
+    interner = StringInterner()
+
+    # Extract, save and aggregate transactions chunk by chunk
+    report("transactions", 10)
+    summaries = summarize_transactions([])
+    transaction_count = 0
+    for chunk in _chunked(transactions, chunk_size):
+        with stage("intern_strings"):
+            interner.annotate(chunk)
+        with stage("insert_transactions"):
+            save_transactions(pdf_id, chunk)
+        with stage("rollups"):
+            update_document_rollups(pdf_id, chunk)
+        if customer_id is not None:
+            with stage("ledger"):
+                new_entries = save_ledger_entries(customer_id, pdf_id, chunk, sequence)
+            with stage("rollups"):
+                update_customer_rollups(customer_id, new_entries)
+        with stage("summarize"):
+            summarize_transactions(chunk, summaries)
+        transaction_count += len(chunk)
+    TRANSACTIONS.inc(transaction_count)
+    note(transactions=transaction_count)
+
+    report("summaries", 80)
+    with stage("save_summaries"):
+        save_summaries(pdf_id, summaries, interner)
+
+    bump_generation(pdf_id)
+
+    # Single flush point for the ORM-built metadata rows
+    with stage("flush"):
+        db.session.flush()
+
+    report("done", 100)
+    return {
+        "transaction_count": transaction_count,
+        "spending": summaries["spending"],
+        "received": summaries["received"],
+        "total_summary": total_summary
+    }
+
+
+def iter_document_transactions(pdf_id, batch_size=1000):
+    """Stream a document's transactions from the database in extractor format."""
+    query = db.session.query(
+        Transaction.receipt_no,
+        Transaction.completion_time,
+        Transaction.details,
+        Transaction.transaction_status,
+        Transaction.paid_in,
+        Transaction.withdraw,
+        Transaction.balance
+    ).filter_by(pdf_id=pdf_id).order_by(Transaction.id) \
+        .execution_options(stream_results=True, yield_per=batch_size)
+
+    for row in query:
+        yield {
+            "receipt_no": row.receipt_no,
+            "completion_time": row.completion_time,
+            "details": row.details,
+            "transaction_status": row.transaction_status,
+            "paid_in": row.paid_in,
+            "withdrawn": row.withdraw,
+            "balance": row.balance
+        }
+
+
+def build_analysis_response(doc, analysis, message="Uploaded and analyzed successfully", **extra):
+    """Return the upload response as an iterator of JSON text chunks.
+
+    Everything except the transactions is rendered up front; the
+    transactions array is then read back from the database in batches as
+    the response is sent, instead of being kept in memory for the request.
+    """
+    dumps = current_app.json.dumps
+    payload = {
+        "id": doc.id,
+        "filename": doc.filename,
+        "uploaded_at": doc.uploaded_at.isoformat(),
+        "success": message,
+        "spending_summary": {category: json_amount(round(v['total'], 2)) for category, v in analysis["spending"].items()},
+        "received_summary": {category: json_amount(round(v['total'], 2)) for category, v in analysis["received"].items()},
+        "total_summary": serialize_total_summary(analysis["total_summary"]),
+        **extra
+    }
+    return _stream_analysis(dumps(payload)[:-1], doc.id, dumps)
+
+
+def _stream_analysis(prefix, pdf_id, dumps):
+    yield prefix + ', "transactions": ['
+    separator = ""
+    for txn in iter_document_transactions(pdf_id):
+        yield separator + dumps(serialize_transaction(txn))
+        separator = ", "
+    yield "]}\n"
+
+
+def bump_generation(pdf_id):
+    """Retire the document's cached responses in every process (see parser.cache)."""
+    PdfDocument.query.filter_by(id=pdf_id).update(
+        {PdfDocument.generation: PdfDocument.generation + 1}, synchronize_session=False
+    )
+
+
+def clear_document_analysis(pdf_id):
+    """Delete every row derived from a document so it can be ingested again."""
+    for model in (Transaction, SpendingSummary, ReceivedSummary, TotalSummary, CustomerDetails, DocumentExtras, DocumentRollup):
+        model.query.filter_by(pdf_id=pdf_id).delete(synchronize_session=False)
+    bump_generation(pdf_id)
+
+
+def discard_unreferenced_blob(store, key):
+    """Delete a blob unless a document still points at it; blobs are content-addressed and shared."""
+    if not PdfDocument.query.filter_by(blob_key=key).first():
+        store.delete(key)
+
+
+def load_document_analysis(pdf_id):
+    """Rebuild the aggregates of an already analyzed document from the database."""
+    spending = SpendingSummary.query.filter_by(pdf_id=pdf_id).order_by(SpendingSummary.id).all()
+    receiving = ReceivedSummary.query.filter_by(pdf_id=pdf_id).order_by(ReceivedSummary.id).all()
+    summary_rows = TotalSummary.query.filter_by(pdf_id=pdf_id).order_by(TotalSummary.id).all()
+
+    return {
+        "spending": {s.category: {'total': s.total_spent, 'count': s.transaction_count} for s in spending},
+        "received": {r.category: {'total': r.total_received, 'count': r.transaction_count} for r in receiving},
+        "total_summary": [
+            {
+                "transaction_type": s.transaction_type,
+                "total_paid_in": s.total_paid_in,
+                "total_paid_out": s.total_paid_out
+            }
+            for s in summary_rows
+        ]
+    }
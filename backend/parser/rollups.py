@@ -0,0 +1,148 @@
+from flask import Blueprint, request, jsonify, current_app, has_app_context
+from models import db, DocumentRollup, CustomerRollup, InternedString
+from datetime import date, timedelta
+from sqlalchemy import func
+from parser.bulk import bulk_upsert_add
+from parser.extract import ZERO
+from parser.serialize import json_amount
+
+rollups_bp = Blueprint("rollups_bp", __name__)
+
+GRANULARITIES = ("day", "week", "month")
+
+
+def period_start(moment, granularity):
+    day = moment.date()
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())  # weeks start on Monday
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _granularities():
+    if has_app_context():
+        return current_app.config.get('ROLLUP_GRANULARITIES', GRANULARITIES)
+    return GRANULARITIES
+
+
+def rollup_transactions(transactions, granularities=None):
+    """Bucket interned transactions into {(granularity, period_start, direction, category_id): [total, count]}."""
+    granularities = granularities or _granularities()
+    buckets = {}
+
+    for txn in transactions:
+        withdrawn = txn['withdrawn']
+        paid_in = txn['paid_in']
+        if not withdrawn and not paid_in:
+            continue
+
+        category_id = txn['category_id']
+        for granularity in granularities:
+            start = period_start(txn['completion_time'], granularity)
+            for direction, amount in (("out", withdrawn), ("in", paid_in)):
+                if amount:
+                    bucket = buckets.setdefault((granularity, start, direction, category_id), [ZERO, 0])
+                    bucket[0] += amount
+                    bucket[1] += 1
+
+    return buckets
+
+
+def _bucket_rows(scope_column, scope_id, buckets):
+    return [
+        {
+            scope_column: scope_id,
+            "granularity": granularity,
+            "period_start": start,
+            "direction": direction,
+            "category_id": category_id,
+            "total": total,
+            "transaction_count": count
+        }
+        for (granularity, start, direction, category_id), (total, count) in buckets.items()
+    ]
+
+
+def update_document_rollups(pdf_id, transactions):
+    bulk_upsert_add(
+        DocumentRollup,
+        _bucket_rows("pdf_id", pdf_id, rollup_transactions(transactions)),
+        ["pdf_id", "granularity", "period_start", "direction", "category_id"],
+        ["total", "transaction_count"]
+    )
+
+
+def update_customer_rollups(customer_id, transactions):
+    # Only pass transactions that were new to the customer's ledger, or they count twice
+    bulk_upsert_add(
+        CustomerRollup,
+        _bucket_rows("customer_id", customer_id, rollup_transactions(transactions)),
+        ["customer_id", "granularity", "period_start", "direction", "category_id"],
+        ["total", "transaction_count"]
+    )
+
+
+@rollups_bp.route("/rollups", methods=["GET"])
+def get_rollups():
+    args = request.args
+    if bool(args.get('pdf_id')) == bool(args.get('customer_id')):
+        return jsonify({"error": "Pass exactly one of pdf_id or customer_id"}), 400
+
+    model, scope_column = (DocumentRollup, 'pdf_id') if args.get('pdf_id') else (CustomerRollup, 'customer_id')
+    try:
+        scope_id = int(args[scope_column])
+        start = date.fromisoformat(args['from']) if args.get('from') else None
+        end = date.fromisoformat(args['to']) if args.get('to') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    granularity = args.get('granularity', 'month')
+    if granularity not in _granularities():
+        return jsonify({"error": f"granularity must be one of: {', '.join(_granularities())}"}), 400
+
+    direction = args.get('direction')
+    if direction not in (None, '', 'in', 'out'):
+        return jsonify({"error": "direction must be 'in' or 'out'"}), 400
+    by_category = args.get('group') == 'category'
+
+    group_columns = [model.period_start, model.direction]
+    if by_category:
+        group_columns.append(InternedString.value.label("category"))
+
+    query = db.session.query(
+        *group_columns,
+        func.sum(model.total).label("total"),
+        func.sum(model.transaction_count).label("transaction_count")
+    ).filter(getattr(model, scope_column) == scope_id, model.granularity == granularity)
+    if by_category or args.get('category'):
+        query = query.join(InternedString, InternedString.id == model.category_id)
+
+    if direction:
+        query = query.filter(model.direction == direction)
+    if args.get('category'):
+        query = query.filter(InternedString.value == args['category'])
+    if start:
+        query = query.filter(model.period_start >= start)
+    if end:
+        query = query.filter(model.period_start <= end)
+
+    rows = query.group_by(*group_columns).order_by(*group_columns).all()
+
+    series = []
+    for row in rows:
+        point = {
+            "period": row.period_start.isoformat(),
+            "direction": row.direction,
+            "total": json_amount(row.total),
+            "transaction_count": int(row.transaction_count)
+        }
+        if by_category:
+            point["category"] = row.category
+        series.append(point)
+
+    return jsonify({
+        scope_column: scope_id,
+        "granularity": granularity,
+        "series": series
+    }), 200
@@ -0,0 +1,40 @@
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+# Amounts are stored as Numeric and times as DateTime; the API keeps the
+# shapes it always had: plain numbers, "YYYY-MM-DD HH:MM:SS" strings and
+# comma-formatted statement totals.
+def json_amount(value):
+    return float(value) if value is not None else None
+
+
+def json_time(value):
+    return value.strftime(TIME_FORMAT) if value is not None else None
+
+
+def money_text(value):
+    return f"{value:,.2f}"
+
+
+def serialize_transaction(txn):
+    """Render a transaction record (dict or row with extractor keys) for JSON."""
+    return {
+        "receipt_no": txn["receipt_no"],
+        "completion_time": json_time(txn["completion_time"]),
+        "details": txn["details"],
+        "transaction_status": txn["transaction_status"],
+        "paid_in": json_amount(txn["paid_in"]),
+        "withdrawn": json_amount(txn["withdrawn"]),
+        "balance": json_amount(txn["balance"])
+    }
+
+
+def serialize_total_summary(rows):
+    return [
+        {
+            "transaction_type": row["transaction_type"],
+            "total_paid_in": money_text(row["total_paid_in"]),
+            "total_paid_out": money_text(row["total_paid_out"])
+        }
+        for row in rows
+    ]
@@ -0,0 +1,216 @@
+from flask import current_app
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+
+class BlobStore:
+    """Content-addressed storage for uploaded statement files.
+
+    Keys are SHA-256 hex digests of the content, so storing the same file
+    twice is a no-op and a key always identifies exactly one payload.
+    """
+
+    def exists(self, key):
+        raise NotImplementedError
+
+    def put_bytes(self, key, data):
+        raise NotImplementedError
+
+    def put_file(self, key, path):
+        raise NotImplementedError
+
+    def move_file(self, key, path):
+        # Returns the blob's new local path, if the backend has one
+        self.put_file(key, path)
+        os.remove(path)
+        return self.local_path(key)
+
+    def spool_dir(self):
+        # Where uploads are spooled; on the store's filesystem a move is a rename
+        return None
+
+    def read(self, key):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def local_path(self, key):
+        # Backends that keep blobs on the local filesystem return the file path
+        # so readers (PyMuPDF, send_file) can open it without copying it.
+        return None
+
+    @contextmanager
+    def open_view(self, key):
+        yield memoryview(self.read(key))
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        if len(key) < 5 or not all(c in '0123456789abcdef' for c in key):
+            raise ValueError(f"Invalid blob key: {key!r}")
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def _publish(self, key, write):
+        # Write to a temporary file next to the target, then rename atomically
+        target = self._path(key)
+        if os.path.exists(target):
+            return target
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                write(tmp)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return target
+
+    def put_bytes(self, key, data):
+        return self._publish(key, lambda tmp: tmp.write(data))
+
+    def put_file(self, key, path):
+        def copy(tmp):
+            with open(path, 'rb') as src:
+                shutil.copyfileobj(src, tmp, 1024 * 1024)
+        return self._publish(key, copy)
+
+    def move_file(self, key, path):
+        target = self._path(key)
+        if os.path.exists(target):
+            os.remove(path)
+            return target
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.replace(path, target)
+        except OSError:
+            # Different filesystem: fall back to a copy
+            self.put_file(key, path)
+            os.remove(path)
+        return target
+
+    def spool_dir(self):
+        path = os.path.join(self.root, 'tmp')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def read(self, key):
+        with open(self._path(key), 'rb') as f:
+            return f.read()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, key):
+        return self._path(key)
+
+    @contextmanager
+    def open_view(self, key):
+        # Memory-mapped, read-only view: pages are loaded on demand by the OS
+        with open(self._path(key), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield memoryview(b'')
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped)
+            try:
+                yield view
+            finally:
+                view.release()
+                mapped.close()
+
+
+_backends = {
+    'local': lambda app: LocalBlobStore(app.config['BLOB_STORE_PATH']),
+}
+
+
+def register_blob_store(name, factory):
+    """Register a backend factory `factory(app) -> BlobStore` under `name`."""
+    _backends[name] = factory
+
+
+def get_blob_store(app=None):
+    app = app or current_app._get_current_object()
+    store = app.extensions.get('blob_store')
+    if store is None:
+        backend = app.config.get('BLOB_STORE', 'local')
+        if backend not in _backends:
+            raise ValueError(f"Unknown blob store backend: {backend}")
+        store = _backends[backend](app)
+        app.extensions['blob_store'] = store
+    return store
+
+
+def blob_key_for(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class SpooledUpload:
+    """An upload written to a temporary file, with its SHA-256 and size."""
+
+    def __init__(self, path, sha256, size):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+
+    def close(self):
+        # The file may already have been moved into the blob store
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+SPOOL_CHUNK_SIZE = 256 * 1024
+
+
+def spool_upload(stream, max_bytes=None, directory=None, chunk_size=SPOOL_CHUNK_SIZE):
+    """Copy `stream` to a temporary file in fixed-size chunks.
+
+    Hashing and the size check happen in the same pass, so memory use does
+    not depend on the size of the upload.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(suffix='.pdf', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(f"File exceeds the {max_bytes} byte upload limit")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return SpooledUpload(path, digest.hexdigest(), size)
@@ -1,60 +1,54 @@
 from flask import Flask, request, jsonify, Blueprint
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.utils import secure_filename
-from models import db, PdfDocument, Transaction, SpendingSummary, ReceivedSummary
+from models import db
 from datetime import datetime
 import os
-from collections import defaultdict
+from parser.bulk import save_spending_summary, save_received_summary
+from parser.extract import ZERO
+from parser.normalize import normalize_details
+from parser.interning import COUNTERPARTY
 
 summary_bp = Blueprint("summary_bp", __name__)
 
 
-def generate_and_save_summary(pdf_id):
-    transactions = Transaction.query.filter_by(pdf_id=pdf_id).all()
-    
-    spending_summary = defaultdict(lambda: {'total': 0.0, 'count': 0})
-
-    for txn in transactions:
-        if not txn.withdraw or txn.withdraw == 0.0:
-            continue  # Skip transactions with no withdrawal
-
-        detail = txn.details.strip().replace('\n', ' ')
-        spending_summary[detail]['total'] += txn.withdraw
-        spending_summary[detail]['count'] += 1
-
-    for detail, values in spending_summary.items():
-        entry = SpendingSummary(
-            pdf_id=pdf_id,
-            category=detail,
-            total_spent=round(values['total'], 2),
-            transaction_count=values['count']
-        )
-        db.session.add(entry)
-
-    db.session.commit()
-
+def counterparty_of(txn):
+    # Transactions annotated by the interner already carry their counterparty
+    return txn.get('counterparty') or normalize_details(txn['details']).counterparty
 
 
-def generate_and_save_received_summary(pdf_id):
-    transactions = Transaction.query.filter_by(pdf_id=pdf_id).all()
+def summarize_transactions(transactions, summaries=None):
+    """Group transactions by canonical counterparty into spending and received totals.
 
-    received_summary = defaultdict(lambda: {'total': 0.0, 'count': 0})
+    Pass the previous result back in as `summaries` to keep running totals
+    while transactions arrive in chunks.
+    """
+    if summaries is None:
+        summaries = {"spending": {}, "received": {}}
+    spending_summary = summaries["spending"]
+    received_summary = summaries["received"]
 
     for txn in transactions:
-        if not txn.paid_in or txn.paid_in == 0.0:
-            continue  # Skip transactions with no incoming amount
-
-        detail = txn.details.strip().replace('\n', ' ')
-        received_summary[detail]['total'] += txn.paid_in
-        received_summary[detail]['count'] += 1
-
-    for detail, values in received_summary.items():
-        entry = ReceivedSummary(
-            pdf_id=pdf_id,
-            category=detail,
-            total_received=round(values['total'], 2),
-            transaction_count=values['count']
-        )
-        db.session.add(entry)
-
-    db.session.commit()
+        withdrawn = txn['withdrawn']
+        paid_in = txn['paid_in']
+        if not withdrawn and not paid_in:
+            continue
+
+        counterparty = counterparty_of(txn)
+        if withdrawn:
+            entry = spending_summary.setdefault(counterparty, {'total': ZERO, 'count': 0})
+            entry['total'] += withdrawn
+            entry['count'] += 1
+        if paid_in:
+            entry = received_summary.setdefault(counterparty, {'total': ZERO, 'count': 0})
+            entry['total'] += paid_in
+            entry['count'] += 1
+
+    return summaries
+
+
+def save_summaries(pdf_id, summaries, interner):
+    # Summaries are keyed by name in memory and by interned id in the database
+    for direction, save in (("spending", save_spending_summary), ("received", save_received_summary)):
+        ids = interner.intern(COUNTERPARTY, summaries[direction].keys())
+        save(pdf_id, {ids[name]: values for name, values in summaries[direction].items()})
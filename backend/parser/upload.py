@@ -1,22 +1,32 @@
-from flask import Flask, request, jsonify, Blueprint
+from flask import Flask, request, jsonify, Blueprint, current_app, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.utils import secure_filename
-from models import db, PdfDocument, Transaction, SpendingSummary,  ReceivedSummary, TotalSummary
+from sqlalchemy.exc import IntegrityError
+from models import db, PdfDocument, IngestionJob, LedgerEntry
 from datetime import datetime
+import logging
 import os
 import re
-import fitz
-from parser.summary import generate_and_save_summary, generate_and_save_received_summary
-from parser.extract import (
-    extract_transactions,
-    extract_metadata,
-    extract_summary_table
+from parser.document import StatementDocument
+from parser.extract import UnreadableTransaction
+from parser.storage import get_blob_store, spool_upload, UploadTooLarge
+from parser.pipeline import (
+    ingest_statement,
+    build_analysis_response,
+    clear_document_analysis,
+    discard_unreferenced_blob,
+    load_document_analysis
 )
+from parser.jobs import enqueue_ingestion, notify_workers
+from parser.cache import invalidate_document
+from parser.metrics import instrument_upload, stage, note, UPLOAD_BYTES
 
 upload_bp = Blueprint("upload_bp", __name__)
+logger = logging.getLogger(__name__)
 
 
 @upload_bp.route('/upload', methods=['POST'])
+@instrument_upload("upload")
 def upload_pdf():
     if 'file' not in request.files:
         return jsonify({"error": "No file provided"}), 400
@@ -31,75 +41,178 @@ def upload_pdf():
     # Clean the password
     password = request.form.get('password', '').strip() or None
 
+    ingest_mode = (request.form.get('mode') or request.args.get('mode')
+                   or current_app.config.get('INGEST_MODE', 'sync')).lower()
+    if ingest_mode not in ('sync', 'async'):
+        return jsonify({"error": "mode must be 'sync' or 'async'"}), 400
+
+    force = request.form.get('force', request.args.get('force', ''))
+    force = force.lower() in ('1', 'true', 'yes') or current_app.config.get('UPLOAD_FORCE_REPROCESS', False)
+
+    # Spool the upload to disk, hashing and enforcing the size limit in the same pass
+    store = get_blob_store()
+    try:
+        with stage("spool"):
+            spooled = spool_upload(
+                file.stream,
+                max_bytes=current_app.config.get('UPLOAD_MAX_BYTES'),
+                directory=store.spool_dir()
+            )
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    UPLOAD_BYTES.inc(spooled.size)
+    note(mode=ingest_mode, bytes=spooled.size)
+
+    published = False
     try:
-        pdf_bytes = file.read()
         filename = secure_filename(file.filename)
+        content_hash = spooled.sha256
+
+        # Identical statement already uploaded: answer from the stored analysis
+        existing = PdfDocument.query.filter_by(content_hash=content_hash).first()
+        if existing:
+            job = _latest_job(existing.id)
+            # Even with force, a queued or running job would ingest on top of our reprocess
+            if job and job.status in ('queued', 'running'):
+                return jsonify(_accepted_response(existing, job)), 202
+        if existing and not force:
+            if job is None or job.status == 'done':
+                return _analysis_response(
+                    build_analysis_response(
+                        existing,
+                        load_document_analysis(existing.id),
+                        message="Statement already analyzed",
+                        cached=True
+                    ),
+                    200
+                )
+            # The previous attempt failed, so fall through and process it again
 
         # Check if the file is a valid PDF before saving
         try:
-            fitz.open(stream=pdf_bytes, filetype='pdf')
+            with stage("open"):
+                statement = StatementDocument(spooled.path)
         except Exception:
             return jsonify({"error": "Invalid or corrupted PDF file."}), 400
 
-        #  Save the file metadata to DB
-        new_doc = PdfDocument(
-            filename=filename,
-            content=pdf_bytes,
-            uploaded_at=datetime.utcnow()
-        )
-        db.session.add(new_doc)
+        if existing:
+            # Reprocess in place: the hash is unique, so reuse the document row
+            doc = existing
+            doc.filename = filename
+            doc.uploaded_at = datetime.utcnow()
+            clear_document_analysis(doc.id)
+        else:
+            #  Save the file metadata to DB
+            doc = PdfDocument(
+                filename=filename,
+                blob_key=content_hash,
+                size=spooled.size,
+                content_hash=content_hash,
+                uploaded_at=datetime.utcnow()
+            )
+            db.session.add(doc)
         db.session.flush()
+        note(pdf_id=doc.id)
 
-        # Extract and save transactions
-        transactions_data = extract_transactions(pdf_bytes, password)
-        for txn in transactions_data:
-            db.session.add(Transaction(
-                pdf_id=new_doc.id,
-                receipt_no=txn['receipt_no'],
-                completion_time=txn['completion_time'],
-                details=txn['details'],
-                transaction_status=txn['transaction_status'],
-                paid_in=txn['paid_in'],
-                withdraw=txn['withdrawn'],
-                balance=txn['balance']
-            ))
-
-        # Extract and save summaries and metadata
-        generate_and_save_summary(new_doc.id)
-        generate_and_save_received_summary(new_doc.id)
-        extract_metadata(new_doc.id, pdf_bytes, password)
-        extract_summary_table(new_doc.id, pdf_bytes, password)
+        # Asynchronous mode: store the blob, queue a job and return immediately
+        if ingest_mode == 'async':
+            statement.close()
+            if not existing:
+                store.move_file(content_hash, spooled.path)
+                published = True
+            job = enqueue_ingestion(doc.id, password)
+            db.session.commit()
+            if existing:
+                invalidate_document(doc.id)
+            notify_workers()
 
-        db.session.commit()
+            return jsonify(_accepted_response(doc, job)), 202
+
+        # Decrypt once; every extractor reads from this shared document
+        with stage("decrypt"):
+            statement.authenticate(password)
+        analysis = ingest_statement(doc.id, statement)
+        statement.close()
+
+        # Only a statement that ingested cleanly is moved into the store
+        if not existing:
+            store.move_file(content_hash, spooled.path)
+            published = True
+        with stage("commit"):
+            db.session.commit()
+        if existing:
+            invalidate_document(doc.id)
 
-        # Fetch summaries for response
-        spending = SpendingSummary.query.filter_by(pdf_id=new_doc.id).all()
-        receiving = ReceivedSummary.query.filter_by(pdf_id=new_doc.id).all()
-        summary_rows = TotalSummary.query.filter_by(pdf_id=new_doc.id).all()
-        
-        spending_summary = {s.category: s.total_spent for s in spending}
-        received_summary = {r.category: r.total_received for r in receiving}
-        total_summary = [
-            {
-                "transaction_type": s.transaction_type,
-                "total_paid_in": s.total_paid_in,
-                "total_paid_out": s.total_paid_out
-            }
-            for s in summary_rows
-        ]
-
-        return jsonify({
-            "id": new_doc.id,
-            "filename": new_doc.filename,
-            "uploaded_at": new_doc.uploaded_at.isoformat(),
-            "success": "Uploaded and analyzed successfully",
-            "transactions": transactions_data,
-            "spending_summary": spending_summary,
-            "received_summary": received_summary,
-            "total_summary": total_summary
-        }), 201
+        return _analysis_response(build_analysis_response(doc, analysis), 201)
+
+    except IntegrityError:
+        # Another request stored the same statement between our lookup and flush
+        db.session.rollback()
+        if published:
+            discard_unreferenced_blob(store, content_hash)
+        return jsonify({"error": "This statement is already being processed"}), 409
+
+    except UnreadableTransaction as e:
+        db.session.rollback()
+        logger.warning("Rejected statement %s: %s", content_hash, e)
+        return jsonify({"error": str(e)}), 422
 
     except Exception as e:
         db.session.rollback()
-        print("ERROR during upload:", e)
+        logger.exception("Upload failed")
+        if published:
+            discard_unreferenced_blob(store, content_hash)
         return jsonify({"error": str(e)}), 500
+
+    finally:
+        spooled.close()
+
+
+@upload_bp.route('/documents/<int:pdf_id>', methods=['DELETE'])
+def delete_document(pdf_id):
+    doc = db.session.get(PdfDocument, pdf_id)
+    if not doc:
+        return jsonify({"error": "Document not found"}), 404
+
+    job = _latest_job(pdf_id)
+    if job and job.status in ('queued', 'running'):
+        return jsonify({"error": "Document is still being processed"}), 409
+
+    blob_key = doc.blob_key
+    try:
+        clear_document_analysis(pdf_id)
+        # The customer's merged ledger keeps its rows; they just lose their source document
+        LedgerEntry.query.filter_by(pdf_id=pdf_id).update({"pdf_id": None}, synchronize_session=False)
+        IngestionJob.query.filter_by(pdf_id=pdf_id).delete(synchronize_session=False)
+        PdfDocument.query.filter_by(id=pdf_id).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Deleting document %s failed", pdf_id)
+        return jsonify({"error": str(e)}), 500
+
+    invalidate_document(pdf_id)
+
+    discard_unreferenced_blob(get_blob_store(), blob_key)
+
+    return jsonify({"success": "Document deleted", "id": pdf_id}), 200
+
+
+def _analysis_response(body, status):
+    # Stream the JSON so the transactions array is never held in memory at once
+    return Response(stream_with_context(body), status=status, mimetype='application/json')
+
+
+def _latest_job(pdf_id):
+    return IngestionJob.query.filter_by(pdf_id=pdf_id).order_by(IngestionJob.id.desc()).first()
+
+
+def _accepted_response(doc, job):
+    return {
+        "id": doc.id,
+        "filename": doc.filename,
+        "uploaded_at": doc.uploaded_at.isoformat(),
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}"
+    }
@@ -0,0 +1,15 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+    uwsgi --http :8000 --module wsgi:app --master --processes 4 --lazy-apps
+
+APP_PROFILE=api or APP_PROFILE=ingest runs the read API and the ingestion
+endpoints as separate deployments (see config.py).
+"""
+from app import create_app
+
+app = create_app()
+
+if app.config['APP_PROFILE'] != 'api':
+    # Loaded before gunicorn forks when preloading, so the workers share MuPDF's pages
+    import fitz  # noqa: F401